@@ -22,6 +22,11 @@ cp "$FRONTEND_DIR"/*.css "$CIUFCIUF_DIR"/ 2>/dev/null || true
 # Kopiowanie skompresowanych plików JSON do podkatalogu ciufciuf
 test -f "$SCRAPER_DIR/stations.json.gz" && cp "$SCRAPER_DIR/stations.json.gz" "$CIUFCIUF_DIR/"
 test -f "$SCRAPER_DIR/trains.json.gz" && cp "$SCRAPER_DIR/trains.json.gz" "$CIUFCIUF_DIR/"
+test -f "$SCRAPER_DIR/station_index.json.gz" && cp "$SCRAPER_DIR/station_index.json.gz" "$CIUFCIUF_DIR/"
+if test -d "$SCRAPER_DIR/reachability"; then
+    rm -rf "$CIUFCIUF_DIR/reachability"
+    cp -r "$SCRAPER_DIR/reachability" "$CIUFCIUF_DIR/"
+fi
 
 # Kopiowanie testowej strony kompresji do głównego katalogu docs
 cp "$(dirname "$0")/test-compression.html" "$DOCS_DIR/" 2>/dev/null || true
@@ -4,6 +4,8 @@ class PolishRailwayMap {
         this.map = null;
         this.stations = {};
         this.trains = {};
+        this.stationIndex = {}; // station_id -> [[trainKey, stopIndex], ...]
+        this.reachability = {}; // station_id -> { travelTimes, trainDetails }
         this.stationMarkers = {};
         this.selectedStationId = null;
         
@@ -103,6 +105,15 @@ class PolishRailwayMap {
                 console.log('Loaded uncompressed trains data');
             }
 
+            // Load station index - build it from trains once if it is not published
+            try {
+                this.stationIndex = await this.loadCompressedJSON('station_index.json.gz');
+                console.log('Loaded station index');
+            } catch (error) {
+                console.log('Station index not available, building it from trains...');
+                this.stationIndex = this.buildStationIndex();
+            }
+
             console.log(`Loaded ${Object.keys(allStations).length} total stations`);
             console.log(`Filtered to ${Object.keys(this.stations).length} rail stations`);
             console.log(`Loaded ${Object.keys(this.trains).length} trains`);
@@ -165,7 +176,7 @@ class PolishRailwayMap {
         console.log(`Added ${Object.keys(this.stationMarkers).length} station markers to map`);
     }
 
-    selectStation(stationId, station) {
+    async selectStation(stationId, station) {
         // Reset previous selection
         this.clearSelection();
 
@@ -177,11 +188,16 @@ class PolishRailwayMap {
             this.stationMarkers[stationId].setIcon(this.selectedStationIcon);
         }
 
+        const result = await this.getDirectTravelTimes(stationId);
+        if (this.selectedStationId !== stationId) {
+            return; // Another station was picked while this one was loading
+        }
+
         // Show connections in sidebar
-        this.showStationConnections(stationId, station);
+        this.showStationConnections(stationId, station, result);
 
         // Color code stations by travel time instead of showing lines
-        this.colorStationsByTravelTime(stationId);
+        this.colorStationsByTravelTime(stationId, result);
 
         // Close sidebar on mobile after selection
         if (window.innerWidth <= 768) {
@@ -208,11 +224,11 @@ class PolishRailwayMap {
         this.selectedStationId = null;
     }
 
-    colorStationsByTravelTime(fromStationId) {
+    colorStationsByTravelTime(fromStationId, result = null) {
         console.log(`Calculating direct travel times from station ${fromStationId}...`);
 
         // Calculate direct travel times to all stations (no transfers)
-        const result = this.calculateDirectTravelTimes(fromStationId);
+        result = result || this.calculateDirectTravelTimes(fromStationId);
         const travelTimes = result.travelTimes;
         const trainDetails = result.trainDetails;
 
@@ -306,6 +322,63 @@ class PolishRailwayMap {
         });
     }
 
+    buildStationIndex() {
+        const index = {};
+        Object.entries(this.trains).forEach(([trainKey, train]) => {
+            (train.stops || []).forEach((stop, stopIndex) => {
+                if (stop.station_id) {
+                    const stationId = stop.station_id.toString();
+                    (index[stationId] = index[stationId] || []).push([trainKey, stopIndex]);
+                }
+            });
+        });
+        return index;
+    }
+
+    async getDirectTravelTimes(fromStationId) {
+        const key = fromStationId.toString();
+        if (!this.reachability[key]) {
+            // Precomputed by the scraper; fall back to scanning the trains
+            try {
+                const table = await this.loadCompressedJSON(`reachability/${key}.json.gz`);
+                this.reachability[key] = this.reachabilityToTravelTimes(fromStationId, table);
+            } catch (error) {
+                this.reachability[key] = this.calculateDirectTravelTimes(fromStationId);
+            }
+        }
+        return this.reachability[key];
+    }
+
+    reachabilityToTravelTimes(fromStationId, table) {
+        const travelTimes = {};
+        const trainDetails = {};
+
+        Object.keys(this.stations).forEach(stationId => {
+            travelTimes[stationId] = Infinity;
+            trainDetails[stationId] = null;
+        });
+        travelTimes[fromStationId] = 0;
+
+        // Each entry is [minutes, trainKey, trainNumber, carrier, departure, arrival], times in seconds since midnight
+        Object.entries(table).forEach(([targetId, [minutes, trainKey, trainNumber, carrier, departure, arrival]]) => {
+            if (targetId in travelTimes) {
+                travelTimes[targetId] = minutes;
+                trainDetails[targetId] = {
+                    trainNumber: trainNumber,
+                    carrier: carrier,
+                    departureTime: this.formatTime(this.secondsToTime(departure)),
+                    arrivalTime: this.formatTime(this.secondsToTime(arrival))
+                };
+            }
+        });
+
+        return { travelTimes, trainDetails };
+    }
+
+    secondsToTime(seconds) {
+        return { hour: Math.floor(seconds / 3600), minute: Math.floor(seconds / 60) % 60 };
+    }
+
     calculateDirectTravelTimes(fromStationId) {
         const travelTimes = {};
         const trainDetails = {}; // Store train info for fastest connections
@@ -319,16 +392,12 @@ class PolishRailwayMap {
         // Set source station to 0
         travelTimes[fromStationId] = 0;
 
-        // Find direct connections from trains
-        Object.values(this.trains).forEach(train => {
-            const stops = train.stops || [];
+        // Find direct connections from the trains stopping at this station
+        (this.stationIndex[fromStationId.toString()] || []).forEach(([trainKey, startIndex]) => {
+            const train = this.trains[trainKey];
+            const stops = (train && train.stops) || [];
 
-            // Find the index of our starting station in this train
-            const startIndex = stops.findIndex(stop =>
-                stop.station_id && stop.station_id.toString() === fromStationId.toString()
-            );
-
-            if (startIndex !== -1) {
+            if (startIndex < stops.length) {
                 // For all subsequent stops on this train, calculate direct travel time
                 for (let i = startIndex + 1; i < stops.length; i++) {
                     const targetStop = stops[i];
@@ -606,20 +675,18 @@ class PolishRailwayMap {
         return timeObj.toString();
     }
 
-    showStationConnections(stationId, station) {
+    showStationConnections(stationId, station, result = null) {
         const sidebar = document.getElementById('selectedStation');
 
         // Calculate travel times to all reachable stations
-        const result = this.calculateDirectTravelTimes(stationId);
+        result = result || this.calculateDirectTravelTimes(stationId);
         const travelTimes = result.travelTimes;
         const trainDetails = result.trainDetails;
 
         // Find all trains that stop at this station
-        const trainsAtStation = Object.entries(this.trains).filter(([trainId, train]) => {
-            return train.stops && train.stops.some(stop =>
-                stop.station_id && stop.station_id.toString() === stationId.toString()
-            );
-        });
+        const trainsAtStation = [...new Set(
+            (this.stationIndex[stationId.toString()] || []).map(([trainKey]) => trainKey)
+        )];
 
         // Get reachable stations with travel times and train details
         const reachableStations = Object.entries(travelTimes)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Wrapper around KoleoAPI used by the Polish Railway Scraper
+"""
+
+import asyncio
+import random
+import time
+from datetime import date
+from typing import Dict, List, Optional
+
+from config import API_CONFIG
+from metrics import Metrics, Tracer
+from rate_limiter import AdaptiveConcurrencyLimiter, TokenBucket
+from response_cache import ResponseCache
+
+try:
+    import aiohttp
+    TRANSIENT_ERRORS = (asyncio.TimeoutError, ConnectionError, aiohttp.ClientConnectionError,
+                        aiohttp.ClientPayloadError)
+except ImportError:
+    TRANSIENT_ERRORS = (asyncio.TimeoutError, ConnectionError)
+
+
+def get_status(error: Exception) -> Optional[int]:
+    """Return the HTTP status code carried by an API error, if any"""
+    for source in (error, getattr(error, 'response', None)):
+        for attribute in ('status', 'status_code'):
+            status = getattr(source, attribute, None)
+            if isinstance(status, int):
+                return status
+    # koleo raises a dedicated exception type when the API throttles us
+    if 'ratelimit' in type(error).__name__.lower():
+        return 429
+    return None
+
+
+def is_overload(error: Exception) -> bool:
+    """Throttling, server errors and timeouts mean the API wants fewer requests"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = get_status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection problems, throttling and server errors are worth retrying"""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    status = get_status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class ScraperAPI:
+    """Routes every KoleoAPI request through the shared rate limiter and retries transient failures
+
+    The rate limiter caps the request rate, the concurrency limiter adapts the
+    number of requests in flight to how the API copes with the load. When a
+    response cache is given, cached responses are returned without touching
+    the network or the request budget. Latencies, outcomes and retries are
+    recorded in `metrics`, and every attempt is traced as a span.
+    """
+
+    def __init__(self, api, rate_limiter: TokenBucket, concurrency_limiter: AdaptiveConcurrencyLimiter,
+                 config: Dict = API_CONFIG, response_cache: Optional[ResponseCache] = None,
+                 metrics: Optional[Metrics] = None, tracer: Optional[Tracer] = None):
+        self.api = api
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.response_cache = response_cache
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.metrics.describe('scraper_api_request_seconds', 'Latency of KoleoAPI requests')
+        self.metrics.describe('scraper_api_requests_total', 'KoleoAPI requests by endpoint and outcome')
+        self.timeout = config['timeout']
+        self.retry_attempts = config['retry_attempts']
+        self.retry_delay = config['retry_delay']
+
+    async def _call(self, method, *args):
+        if self.response_cache is not None:
+            hit, response = self.response_cache.get(method.__name__, args)
+            self.metrics.inc('scraper_response_cache_total', endpoint=method.__name__, result='hit' if hit else 'miss')
+            if hit:
+                return response
+            response = await self._request(method, *args)
+            self.response_cache.put(method.__name__, args, response)
+            return response
+        return await self._request(method, *args)
+
+    async def _request(self, method, *args):
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            started_at = await self.concurrency_limiter.acquire()
+            overloaded = False
+            outcome = 'ok'
+            try:
+                with self.tracer.span(f'koleo.{method.__name__}', args=list(args), attempt=attempt):
+                    return await asyncio.wait_for(method(*args), self.timeout)
+            except Exception as e:
+                overloaded = is_overload(e)
+                outcome = str(get_status(e) or type(e).__name__)
+                if attempt >= self.retry_attempts or not is_retryable(e):
+                    raise
+                error = e
+            finally:
+                await self.concurrency_limiter.release(started_at, overloaded)
+                self.metrics.observe('scraper_api_request_seconds', time.monotonic() - started_at,
+                                     endpoint=method.__name__)
+                self.metrics.inc('scraper_api_requests_total', endpoint=method.__name__, outcome=outcome)
+                self.metrics.set('scraper_api_concurrency_limit', int(self.concurrency_limiter.limit))
+
+            self.metrics.inc('scraper_api_retries_total', endpoint=method.__name__)
+
+            # Exponential backoff with full jitter, so retrying workers do not fire in lockstep
+            delay = random.uniform(0, self.retry_delay * 2 ** attempt)
+            attempt += 1
+            print(f"Retrying {method.__name__} after {type(error).__name__}: {error} "
+                  f"(retry {attempt}/{self.retry_attempts} in {delay:.1f}s)")
+            await asyncio.sleep(delay)
+
+    async def get_stations(self) -> List[Dict]:
+        return await self._call(self.api.get_stations)
+
+    async def get_departures(self, station_id: int, search_date: date) -> List[Dict]:
+        return await self._call(self.api.get_departures, station_id, search_date)
+
+    async def get_train(self, train_id: int) -> Dict:
+        return await self._call(self.api.get_train, train_id)
+
+    async def close(self):
+        if self.response_cache is not None:
+            self.response_cache.close()
+        await self.api.close()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Crawl benchmark for the Polish Railway Scraper
+Runs scrape_all_trains against FakeKoleoAPI and reports throughput and API call accounting
+"""
+
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, Tuple
+
+import click
+
+from config import API_CONFIG, SCRAPER_CONFIG
+from fake_api import FakeKoleoAPI
+from main import PolishRailwayScraper
+
+
+def generate_network(station_count: int, train_count: int, seed: int = 1) -> Tuple[Dict, Dict]:
+    """Generate a synthetic rail network in the stations.json.gz / trains.json.gz formats
+
+    Stations are picked for routes with Zipf-like weights, so a few hubs are
+    served by many trains and most stations by only a handful.
+    """
+    rng = random.Random(seed)
+
+    stations = {}
+    for station_id in range(1, station_count + 1):
+        stations[station_id] = {
+            'id': station_id,
+            'name': f'Station {station_id}',
+            'city': f'City {station_id % 500}',
+            'latitude': rng.uniform(49.0, 54.8),
+            'longitude': rng.uniform(14.1, 24.1),
+            'country': 'Polska',
+            'transport_mode': 'rail',
+            'type': 'StopPlace',
+            'region': None,
+            'ibnr': None,
+            'time_zone': 'Europe/Warsaw'
+        }
+
+    station_ids = list(stations)
+    weights = [1 / rank for rank in range(1, station_count + 1)]
+    trains = {}
+    for train_id in range(1, train_count + 1):
+        stop_count = min(station_count, rng.randint(3, 30))
+        route = set()
+        while len(route) < stop_count:
+            route.update(rng.choices(station_ids, weights, k=stop_count - len(route)))
+
+        minute = rng.randint(0, 22 * 60)
+        stops = []
+        for station_id in rng.sample(sorted(route), len(route)):
+            time_obj = {'hour': minute // 60 % 24, 'minute': minute % 60, 'second': 0}
+            stops.append({
+                'station_id': station_id,
+                'station_name': stations[station_id]['name'],
+                'arrival_time': time_obj,
+                'departure_time': time_obj
+            })
+            minute += rng.randint(2, 15)
+
+        trains[str(train_id)] = {
+            'train_id': train_id,
+            'train_number': str(10000 + train_id),
+            'carrier': rng.randint(1, 30),
+            'date': '',
+            'stops': stops,
+            'route_name': None,
+            'total_stops': len(stops)
+        }
+
+    return stations, trains
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+async def measure_loop_lag(lags: list, interval: float = 0.005):
+    """Record how late the event loop wakes up a sleeping task, i.e. how long it was blocked"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_benchmark(api: FakeKoleoAPI, concurrency: int, checkpoint_trains: int = None) -> Dict:
+    """Crawl every station of the fake API in a scratch directory and collect the numbers"""
+    scraper = PolishRailwayScraper(concurrency=concurrency, api=api, checkpoint_trains=checkpoint_trains,
+                                   checkpoint_stations=0 if checkpoint_trains else None)
+    partial_save_seconds = []
+    loop_lags = []
+
+    # Time the periodic checkpoints without changing how they are triggered
+    save_partial_data = scraper.save_partial_data
+
+    async def timed_save_partial_data():
+        started = time.perf_counter()
+        await save_partial_data()
+        partial_save_seconds.append(time.perf_counter() - started)
+
+    scraper.save_partial_data = timed_save_partial_data
+
+    try:
+        await scraper.fetch_stations()
+
+        started = time.perf_counter()
+        lag_monitor = asyncio.create_task(measure_loop_lag(loop_lags))
+        try:
+            await scraper.scrape_all_trains()
+        finally:
+            lag_monitor.cancel()
+        crawl_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scraper.save_final_data()
+        final_save_seconds = time.perf_counter() - started
+    finally:
+        await scraper.close()
+
+    api_calls = sum(api.calls.values())
+    cached_trains = scraper.metrics.value('scraper_train_cache_total', result='hit')
+    shared_requests = scraper.metrics.value('scraper_train_cache_total', result='shared')
+    new_trains = scraper.metrics.value('scraper_train_cache_total', result='miss')
+    resolved = cached_trains + shared_requests + new_trains
+    latencies = scraper.metrics.histograms.get('scraper_api_request_seconds', {})
+    return {
+        'stations': len(scraper.processed_stations),
+        'trains': len(scraper.trains),
+        'crawl_days': scraper.window_days,
+        'concurrency': scraper.concurrency,
+        'crawl_seconds': round(crawl_seconds, 3),
+        'stations_per_second': round(len(scraper.processed_stations) / crawl_seconds, 2),
+        'new_trains_per_second': round(new_trains / crawl_seconds, 2),
+        'api_calls': dict(api.calls),
+        'api_errors': {str(status): count for status, count in api.errors.items()},
+        'api_calls_per_new_train': round(api_calls / new_trains, 3) if new_trains else None,
+        'api_mean_latency_ms': {dict(labels)['endpoint']: round(h.sum / h.count * 1000, 2)
+                                for labels, h in latencies.items() if h.count},
+        'cached_trains': cached_trains,
+        'shared_train_requests': shared_requests,
+        'new_trains': new_trains,
+        'reused_train_runs': scraper.metrics.value('scraper_train_runs_reused_total'),
+        'cache_hit_rate': round((cached_trains + shared_requests) / resolved, 4) if resolved else None,
+        'partial_saves': len(partial_save_seconds),
+        'partial_save_seconds': round(sum(partial_save_seconds), 3),
+        'partial_save_blocking_seconds': round(sum(
+            h.sum for h in scraper.metrics.histograms.get('scraper_save_blocking_seconds', {}).values()), 3),
+        'max_event_loop_lag_ms': round(max(loop_lags, default=0) * 1000, 1),
+        'final_save_seconds': round(final_save_seconds, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+@click.command()
+@click.option('--stations', 'station_count', type=int, default=300, show_default=True,
+              help='Number of stations in the synthetic network')
+@click.option('--trains', 'train_count', type=int, default=1000, show_default=True,
+              help='Number of trains in the synthetic network')
+@click.option('--replay', is_flag=True, help='Replay stations.json.gz and trains.json.gz instead of a synthetic network')
+@click.option('--concurrency', type=int, default=SCRAPER_CONFIG['concurrency'], show_default=True,
+              help='Number of stations crawled in parallel')
+@click.option('--days', type=int, default=SCRAPER_CONFIG['crawl_days'], show_default=True,
+              help='Number of days crawled per station')
+@click.option('--latency', type=float, default=0.005, show_default=True, help='Fake API latency in seconds')
+@click.option('--error-rate', type=float, default=0.0, show_default=True, help='Fraction of fake API calls failing with 503')
+@click.option('--requests-per-minute', type=int, default=SCRAPER_CONFIG['max_requests_per_minute'], show_default=True,
+              help='Request budget of the scraper')
+@click.option('--unthrottled', is_flag=True,
+              help='Lift the request budget to measure the crawl itself rather than the rate limit')
+@click.option('--checkpoint-trains', type=int,
+              help='Checkpoint after this many new trains instead of every '
+                   f'{SCRAPER_CONFIG["checkpoint_every_stations"]} stations')
+@click.option('--seed', type=int, default=1, show_default=True, help='Seed for the network and the fake API')
+@click.option('--json-output', type=click.Path(dir_okay=False), help='Also write the results to this JSON file')
+def main(station_count, train_count, replay, concurrency, days, latency, error_rate, requests_per_minute,
+         unthrottled, checkpoint_trains, seed, json_output):
+    """Benchmark a full crawl against an offline fake API"""
+    if replay:
+        api = FakeKoleoAPI.from_files(latency=latency, error_rate=error_rate, seed=seed)
+    else:
+        stations, trains = generate_network(station_count, train_count, seed)
+        api = FakeKoleoAPI(stations, trains, latency=latency, error_rate=error_rate, seed=seed)
+
+    # A budget far above what the fake API can serve effectively disables throttling
+    SCRAPER_CONFIG['max_requests_per_minute'] = 1000000 if unthrottled else requests_per_minute
+    SCRAPER_CONFIG['crawl_days'] = days
+    # Keep injected errors from dominating the run time
+    API_CONFIG['retry_delay'] = min(API_CONFIG['retry_delay'], 0.1)
+
+    # The scraper reads and writes its files in the working directory
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='scraper-benchmark-') as scratch_dir:
+        os.chdir(scratch_dir)
+        try:
+            results = asyncio.run(run_benchmark(api, concurrency, checkpoint_trains))
+        finally:
+            os.chdir(original_dir)
+
+    print("\nBenchmark results:")
+    for name, value in results.items():
+        print(f"  {name}: {value}")
+
+    if json_output:
+        with open(json_output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
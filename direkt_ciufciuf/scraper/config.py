@@ -1,19 +1,56 @@
 # Configuration file for the scraper
 SCRAPER_CONFIG = {
+    # Steady request budget shared by all API calls; only raise it if the API allows more. A full crawl is about
+    # 22k departure requests (3100 rail stations x crawl_days) plus about 19k train routes, roughly 11 hours at 60;
+    # a --delta refresh of one new day is about 6k requests, under 2 hours
     "max_requests_per_minute": 60,
-    "delay_between_requests": 1.0,
+    "delay_between_requests": 1.0,  # Used as the budget when max_requests_per_minute is not set
+    "rate_limit_burst": 5,  # Requests allowed back to back before the budget kicks in
+    "initial_in_flight_requests": 4,  # Starting point of the adaptive API concurrency limit
+    "max_in_flight_requests": 32,  # Upper bound of the adaptive API concurrency limit
+    "latency_spike_factor": 2.0,  # 90th percentile latency above this multiple of the baseline reduces concurrency
+    "latency_window": 50,  # Responses per window the 90th percentile latency is taken over
+    "latency_slow_windows": 2,  # Windows in a row over the baseline before concurrency is reduced
+    "latency_baseline_windows": 20,  # Recent windows whose lowest 90th percentile is the latency baseline
     "max_distance_km": 800,  # Maximum reasonable train distance in Poland
     "output_dir": "data",
     "log_level": "INFO",
     "resume_on_error": True,
-    "batch_size": 50,  # Number of stations to process before saving partial data
+    "checkpoint_every_stations": 500,  # Stations (or work queue tasks) crawled between checkpoints, 0 disables
+    "checkpoint_every_seconds": 0,  # Seconds between checkpoints, 0 disables
+    "checkpoint_every_trains": 0,  # New trains fetched between checkpoints, 0 disables
+    "crawl_days": 7,  # Number of days of departures fetched per station, starting tomorrow
+    "concurrency": 8,  # Number of stations crawled in parallel
+    "train_workers": 16,  # Workers fetching train routes for the departures found by the station workers
+    "train_queue_size": 256,  # Train routes waiting to be fetched before station workers are held back
+    "write_queue_size": 256,  # Fetched train routes waiting to be stored
 }
 
 # API Configuration
 API_CONFIG = {
-    "timeout": 30,
-    "retry_attempts": 3,
-    "retry_delay": 5,
+    "timeout": 30,  # Seconds allowed for a single request
+    "retry_attempts": 3,  # Retries of a timed out, throttled or failed (5xx) request
+    "retry_delay": 5,  # Base backoff in seconds, doubled on every retry
+}
+
+# Optional on-disk cache of API responses (enabled with --response-cache)
+RESPONSE_CACHE_CONFIG = {
+    "path": "response_cache.sqlite3",
+    "max_size_mb": 512,
+    "ttl_seconds": {  # How long a cached response stays valid, per endpoint
+        "get_stations": 7 * 24 * 3600,
+        "get_departures": 6 * 3600,
+        "get_train": 24 * 3600,
+    },
+}
+
+# Work queue shared by cooperating scraper processes (--work-queue)
+WORK_QUEUE_CONFIG = {
+    "lease_seconds": 600,  # A task claimed by a process that stops renewing its leases is handed out again
+    "max_attempts": 5,  # Claims of a task before it is given up as failed
+    "poll_seconds": 5,  # Wait between claims while other processes still hold leases
+    "heartbeat_seconds": 60,  # Interval at which a process renews its leases, well below lease_seconds
+    "train_poll_seconds": 1,  # Wait for a train route that another process is fetching
 }
 
 # Data validation rules
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Coverage-driven ordering of the stations to crawl
+"""
+
+import heapq
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models import NO_STATION, Train
+
+# Queue classes, crawled in this order
+RESUMED, EXPECTED, UNKNOWN, EXPLAINED = range(4)
+
+
+class DeparturePatterns:
+    """Train numbers seen departing from each station in earlier crawls
+
+    A train number keeps its route from day to day, so the numbers that left a
+    station before are what its departures are expected to hold again.
+    """
+
+    def __init__(self):
+        self.by_station: Dict[int, Set[str]] = defaultdict(set)
+
+    def add(self, train_number: Optional[str], station_ids: Iterable[int]):
+        """Record a train departing from the given stations"""
+        if train_number is None:
+            return
+        for station_id in station_ids:
+            if station_id is not None and station_id != NO_STATION:
+                self.by_station[station_id].add(train_number)
+
+    def add_record(self, record: Dict):
+        """Record a train in the trains.json.gz format; its last stop has no departure"""
+        stops = record.get('stops') or []
+        self.add(record.get('train_number'), (stop.get('station_id') for stop in stops[:-1]))
+
+
+class CrawlPlanner:
+    """Hand out stations greedily by the number of trains still expected there
+
+    The departures of a station on the crawled dates hold every train leaving
+    it, and one station query finds a train on all of those dates. A known
+    train number is therefore explained as soon as any crawled station returned
+    it, and a station's expected new trains are its known numbers not yet
+    explained there. Hubs come first and stations whose known departures are
+    all explained come last. Stations without history cannot be judged and
+    are crawled in between.
+    """
+
+    def __init__(self, station_ids: List[int], patterns: DeparturePatterns, resumed: Iterable[int] = ()):
+        self.patterns = patterns
+        self.explained: Dict[int, Set[str]] = defaultdict(set)
+
+        resumed = set(resumed)
+        self.heap = []
+        for order, station_id in enumerate(station_ids):
+            if station_id in resumed:
+                self.heap.append((RESUMED, 0, order, station_id))
+            else:
+                self.heap.append(self.priority(station_id, order))
+        heapq.heapify(self.heap)
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def expected_new(self, station_id: int) -> int:
+        return len(self.patterns.by_station.get(station_id, ()) - self.explained.get(station_id, set()))
+
+    def priority(self, station_id: int, order: int) -> Tuple[int, int, int, int]:
+        if station_id not in self.patterns.by_station:
+            return UNKNOWN, 0, order, station_id
+        expected = self.expected_new(station_id)
+        if not expected:
+            return EXPLAINED, 0, order, station_id
+        return EXPECTED, -expected, order, station_id
+
+    def counts(self) -> Dict[str, int]:
+        """Number of queued stations per class"""
+        names = {RESUMED: 'resumed', EXPECTED: 'expected', UNKNOWN: 'unknown', EXPLAINED: 'explained'}
+        counts = dict.fromkeys(names.values(), 0)
+        for entry in self.heap:
+            counts[names[entry[0]]] += 1
+        return counts
+
+    def record(self, trains: Iterable[Train]):
+        """Mark the train numbers of crawled trains as explained at every station they leave"""
+        for train in trains:
+            if train.train_number is None:
+                continue
+            for station_id in train.station_ids[:-1]:
+                self.explained[station_id].add(train.train_number)
+
+    def next_station(self) -> Optional[Tuple[int, bool]]:
+        """Pop the station with the most expected new trains, or None when done
+
+        Returns the station id and whether its known departures are all
+        explained already. Priorities only drop as trains get explained, so a
+        popped entry whose priority is still current is the best one left.
+        """
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            kind, _, order, station_id = entry
+            if kind != RESUMED:
+                current = self.priority(station_id, order)
+                if current != entry:
+                    heapq.heappush(self.heap, current)
+                    continue
+            return station_id, kind == EXPLAINED
+        return None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for KoleoAPI used for load tests and benchmarks
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict, deque
+from datetime import date
+from typing import Dict, List, Optional
+
+from train_store import iter_json_mapping
+
+
+class FakeAPIError(Exception):
+    """Error raised by FakeKoleoAPI, carries an HTTP status like the real client errors"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class FakeKoleoAPI:
+    """Serves get_stations, get_departures and get_train from an in-memory timetable
+
+    Stations and trains use the stations.json.gz / trains.json.gz formats, and
+    every train is treated as running on every requested date. Each call waits
+    `latency` seconds (plus up to `latency_jitter`), fails with a 503 with
+    probability `error_rate`, and fails with a 429 when more than
+    `rate_limit_per_second` requests arrive within one second. Calls are
+    counted per endpoint in `calls`.
+    """
+
+    def __init__(self, stations: Dict, trains: Dict, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_per_second: Optional[float] = None, seed: Optional[int] = None):
+        self.stations = stations
+        self.trains = {train['train_id']: train for train in trains.values()}
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_per_second = rate_limit_per_second
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = Counter()
+        self._recent_requests = deque()
+
+        # Trains departing from each station; the last stop of a route has no departure
+        self.departures_by_station = defaultdict(list)
+        for train in self.trains.values():
+            for stop in train['stops'][:-1]:
+                self.departures_by_station[stop['station_id']].append(train)
+
+    @classmethod
+    def from_files(cls, stations_file: str = 'stations.json.gz', trains_file: str = 'trains.json.gz',
+                   **kwargs) -> 'FakeKoleoAPI':
+        """Replay a dataset produced by the scraper"""
+        stations = dict(iter_json_mapping(stations_file))
+        trains = dict(iter_json_mapping(trains_file))
+        return cls(stations, trains, **kwargs)
+
+    async def _request(self, endpoint: str):
+        self.calls[endpoint] += 1
+
+        if self.rate_limit_per_second:
+            now = time.monotonic()
+            while self._recent_requests and now - self._recent_requests[0] > 1.0:
+                self._recent_requests.popleft()
+            if len(self._recent_requests) >= self.rate_limit_per_second:
+                self.errors[429] += 1
+                raise FakeAPIError(429, "Too Many Requests")
+            self._recent_requests.append(now)
+
+        delay = self.latency + self.random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors[503] += 1
+            raise FakeAPIError(503, "Service Unavailable")
+
+    async def get_stations(self) -> List[Dict]:
+        await self._request('get_stations')
+        return [dict(station) for station in self.stations.values()]
+
+    async def get_departures(self, station_id: int, search_date: date) -> List[Dict]:
+        await self._request('get_departures')
+        return [
+            {
+                'stations': [{'train_id': train['train_id']}],
+                'train_full_name': train['train_number'],
+                'brand_id': train['carrier'],
+            }
+            for train in self.departures_by_station.get(station_id, [])
+        ]
+
+    async def get_train(self, train_id: int) -> Dict:
+        await self._request('get_train')
+        train = self.trains.get(train_id)
+        if train is None:
+            self.errors[404] += 1
+            raise FakeAPIError(404, f"Train {train_id} not found")
+        return {
+            'train': {'name': train['route_name']},
+            'stops': [
+                {
+                    'station_id': stop['station_id'],
+                    'station_name': stop['station_name'],
+                    'arrival': stop['arrival_time'],
+                    'departure': stop['departure_time'],
+                }
+                for stop in train['stops']
+            ],
+        }
+
+    async def close(self):
+        pass
@@ -5,38 +5,130 @@ Uses koleo-cli to fetch train stations and connections data
 """
 
 import asyncio
+import contextlib
 import json
 import gzip
 import os
 import sys
 import time
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 import click
 from dotenv import load_dotenv
 from tqdm.asyncio import tqdm
 
-# Import koleo functionality
+from api_client import ScraperAPI
+from crawl_planner import CrawlPlanner, DeparturePatterns
+from config import RESPONSE_CACHE_CONFIG, SCRAPER_CONFIG, WORK_QUEUE_CONFIG
+from metrics import Metrics, Tracer
+from models import Train, record_dates, train_key
+from reachability import write_reachability_tables
+from rate_limiter import AdaptiveConcurrencyLimiter, SharedTokenBucket, TokenBucket
+from response_cache import ResponseCache
+from shards import SHARDS_DIR, shard_directory, shard_of
+from station_index import build_station_index
+from train_columns import write_train_columns
+from train_store import TrainStore, iter_json_mapping, write_json_mapping
+from work_queue import WorkQueue
+
+# Import koleo functionality; offline runs with a fake API (see fake_api.py) work without it
 try:
     from koleo import KoleoAPI
 except ImportError:
-    print("Error: koleo package not found. Please install with: pip install koleo-cli")
-    sys.exit(1)
+    KoleoAPI = None
 
 load_dotenv()
 
+CHECKPOINT_FILE = 'crawl_checkpoint.json'
+MAX_RUN_DAYS = 3  # Calendar days a single train run can span
+DEPARTURES_PER_YIELD = 100  # Departures handled before a station worker lets the other tasks run
+
+
+def run_date(route: Train, station_id: int, search_date: date) -> str:
+    """Date of the run that leaves `station_id` on `search_date`: a day earlier per midnight passed before it"""
+    return (search_date - timedelta(days=route.day_offset(station_id))).isoformat()
+
+
 class PolishRailwayScraper:
     """Scraper for Polish railway connections using koleo-cli"""
 
-    def __init__(self):
-        self.api = KoleoAPI()
+    def __init__(self, concurrency: int = None, delta: bool = False, response_cache: bool = False, api=None,
+                 metrics_file: str = None, trace_file: str = None, skip_explained: bool = False,
+                 shard_index: int = 0, shard_count: int = 1, work_queue: str = None, train_workers: int = None,
+                 checkpoint_stations: int = None, checkpoint_seconds: float = None, checkpoint_trains: int = None):
+        if api is not None:
+            koleo_api = api
+        elif KoleoAPI is None:
+            print("Error: koleo package not found. Please install with: pip install koleo-cli")
+            sys.exit(1)
+        else:
+            koleo_api = KoleoAPI()
         # Add required header for EOL API
-        if hasattr(self.api, 'base_headers'):
-            self.api.base_headers['Accept-EOL-Response-Version'] = '1'
+        if hasattr(koleo_api, 'base_headers'):
+            koleo_api.base_headers['Accept-EOL-Response-Version'] = '1'
+        # Metrics are exported to metrics_file at every save, spans are appended to trace_file
+        self.metrics = Metrics()
+        self.metrics_file = metrics_file
+        self.tracer = Tracer(trace_file)
+        self.save_bytes = 0  # Bytes written by the save in progress
+        # (station, date) tasks shared with other processes instead of crawling every station here
+        self.work_queue = WorkQueue.from_config(work_queue, WORK_QUEUE_CONFIG) if work_queue else None
+        # All requests share one request budget and an adaptive in-flight limit, see SCRAPER_CONFIG;
+        # processes working on one queue share the budget too
+        rate_limiter = TokenBucket.from_config(SCRAPER_CONFIG)
+        if self.work_queue is not None:
+            rate_limiter = SharedTokenBucket(rate_limiter.rate, rate_limiter.capacity,
+                                             self.work_queue.take_request_token)
+        self.api = ScraperAPI(koleo_api, rate_limiter,
+                              AdaptiveConcurrencyLimiter.from_config(SCRAPER_CONFIG),
+                              response_cache=ResponseCache.from_config(RESPONSE_CACHE_CONFIG) if response_cache else None,
+                              metrics=self.metrics, tracer=self.tracer)
         self.stations = {}
-        self.trains = {}  # Store complete train routes instead of connections
+        self.trains = {}  # Complete train routes as compact Train objects keyed by train id, with their run dates
+        # Trains that only ran before the crawl window; the published files drop them once a crawl ran
+        self.expired_trains = {}
+        self.crawl_ran = False  # Train files are only rewritten after a crawl, which also completes the checkpoint
+        # unless some stations failed
         self.processed_stations = set()
+        self.pending_trains = {}  # In-flight get_train requests keyed by train id
+        # get_train takes no date, so a route fetched by this crawl serves every date the train runs on
+        self.fetched_routes = set()
+        self.concurrency = max(1, concurrency or SCRAPER_CONFIG['concurrency'])
+        # Station workers hand new trains to train workers, which hand fetched routes to a writer
+        self.train_workers = max(1, train_workers or SCRAPER_CONFIG['train_workers'])
+        self.train_queue = None  # Bounded queues, set while train_pipeline runs
+        self.write_queue = None
+        # Departures are crawled for a window of days starting from tomorrow
+        self.window_start = date.today() + timedelta(days=1)
+        self.window_days = SCRAPER_CONFIG['crawl_days']
+        self.window_dates = [self.window_start + timedelta(days=day_offset) for day_offset in range(self.window_days)]
+        # In delta mode only the window dates not covered by earlier crawls are queried
+        self.delta = delta
+        self.covered_dates = set()  # ISO dates for which every station has been crawled
+        self.crawl_dates = self.window_dates
+        self.in_progress_stations = set()
+        # Train numbers leaving each station in any loaded train, used to plan the crawl order
+        self.departure_patterns = DeparturePatterns()
+        # Skip stations whose known departures are all explained by trains found this crawl
+        self.skip_explained = skip_explained
+        # Only stations with shard_of(station_id, shard_count) == shard_index are crawled
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.train_store = TrainStore()
+        # A checkpoint is due after this many crawled stations (or tasks), seconds or new trains; 0 disables a rule
+        self.checkpoint_stations = (SCRAPER_CONFIG['checkpoint_every_stations'] if checkpoint_stations is None
+                                    else checkpoint_stations)
+        self.checkpoint_seconds = (SCRAPER_CONFIG['checkpoint_every_seconds'] if checkpoint_seconds is None
+                                   else checkpoint_seconds)
+        self.checkpoint_trains = (SCRAPER_CONFIG['checkpoint_every_trains'] if checkpoint_trains is None
+                                  else checkpoint_trains)
+        self.crawled_since_checkpoint = 0
+        self.new_trains_since_checkpoint = 0
+        self.last_checkpoint = time.monotonic()
+        self.checkpoint_task = None  # Checkpoint being written in the background
+        self.checkpoint_lock = asyncio.Lock()
         self.load_existing_data()
+        self.load_checkpoint()
 
     def load_existing_data(self):
         """Load existing trains and stations from JSON files to avoid re-scraping"""
@@ -62,27 +154,141 @@ class PolishRailwayScraper:
             except Exception as e:
                 print(f"Warning: Could not load existing stations: {e}")
 
-        # Load existing trains
-        if os.path.exists('trains.json.gz'):
+        # Load existing trains, one train at a time to keep peak memory low
+        for trains_file in ('trains.json.gz', 'trains.json'):
+            if os.path.exists(trains_file):
+                try:
+                    # Keys are rebuilt from the records, which also upgrades files keyed by train id and date
+                    loaded = self.cache_trains(record for _, record in iter_json_mapping(trains_file))
+                    print(f"Loaded {loaded} existing trains from {trains_file}")
+                except Exception as e:
+                    print(f"Warning: Could not load existing trains from {trains_file}: {e}")
+                break
+
+        # Replay trains and run dates stored since the last compaction into trains.json.gz
+        restored = self.cache_trains(record for _, record in self.train_store.iter_trains())
+        if restored:
+            print(f"Restored {restored} train records from the train store")
+
+        cached, expired = self.expire_trains()
+        if expired:
+            print(f"{cached} trains run in the crawl window, {expired} only ran before it and are not used as cache")
+
+    def is_in_window(self, operating_date: str) -> bool:
+        """Check whether a run starting on a YYYY-MM-DD date can depart within the current crawl window
+
+        Runs are dated by their first stop, so one that started a day or two
+        before the window may still depart from later stations inside it.
+        """
+        earliest_start = self.window_start - timedelta(days=MAX_RUN_DAYS - 1)
+        window_end = self.window_start + timedelta(days=self.window_days)
+        return earliest_start.isoformat() <= operating_date < window_end.isoformat()
+
+    def cache_trains(self, records) -> int:
+        """Add train records to the cache, returns the number of records
+
+        A later record of a train replaces its route and adds its run dates;
+        records without stops only add run dates (see add_run).
+        """
+        count = 0
+        for record in records:
+            count += 1
+            self.departure_patterns.add_record(record)
+            key = train_key(record['train_id'])
+            cached = self.trains.get(key)
+            if 'stops' not in record:
+                if cached is not None:
+                    cached.dates.update(record_dates(record))
+                continue
+            train = Train.from_dict(record)
+            if cached is not None:
+                train.dates |= cached.dates
+            self.trains[key] = train
+        return count
+
+    def expire_trains(self) -> Tuple[int, int]:
+        """Drop the run dates outside the crawl window and set trains without any aside as expired
+
+        Returns the number of cached and expired trains.
+        """
+        for key, train in list(self.trains.items()):
+            dates = {d for d in train.dates if self.is_in_window(d)}
+            if dates:
+                train.dates = dates
+            else:
+                self.expired_trains[key] = self.trains.pop(key)
+        return len(self.trains), len(self.expired_trains)
+
+    def load_checkpoint(self):
+        """Restore the covered dates and the progress of an interrupted crawl of the same dates"""
+        checkpoint = {}
+        if os.path.exists(CHECKPOINT_FILE):
             try:
-                existing_trains = self.load_compressed_json('trains.json.gz')
-                # Convert keys to strings for consistency
-                self.trains = {str(k): v for k, v in existing_trains.items()}
-                print(f"Loaded {len(self.trains)} existing trains from compressed cache")
+                with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                    checkpoint = json.load(f)
             except Exception as e:
-                print(f"Warning: Could not load compressed trains: {e}")
-        elif os.path.exists('trains.json'):
-            try:
-                with open('trains.json', 'r', encoding='utf-8') as f:
-                    existing_trains = json.load(f)
-                # Convert keys to strings for consistency
-                self.trains = {str(k): v for k, v in existing_trains.items()}
-                print(f"Loaded {len(self.trains)} existing trains from cache")
-            except Exception as e:
-                print(f"Warning: Could not load existing trains: {e}")
+                print(f"Warning: Could not load crawl checkpoint: {e}")
+
+        # Dates that have passed fall out of the window and are pruned
+        window_dates = [d.isoformat() for d in self.window_dates]
+        self.covered_dates = {d for d in checkpoint.get('covered_dates', []) if d in window_dates}
+
+        if self.delta:
+            self.crawl_dates = [d for d in self.window_dates if d.isoformat() not in self.covered_dates]
+            print(f"Delta crawl: {len(self.covered_dates)} of {len(window_dates)} days already covered, "
+                  f"crawling {', '.join(d.isoformat() for d in self.crawl_dates) or 'nothing'}")
+
+        crawl_dates = [d.isoformat() for d in self.crawl_dates]
+        if not checkpoint:
+            return
+        if checkpoint.get('crawl_dates') != crawl_dates:
+            print(f"Ignoring progress of a crawl of different dates ({', '.join(checkpoint.get('crawl_dates', []))})")
+            return
+        if checkpoint.get('complete'):
+            print("The last crawl of these dates completed, crawling them again")
+            return
+
+        self.processed_stations = set(checkpoint.get('processed_stations', []))
+        # Stations that were being crawled when the run stopped get crawled first
+        self.in_progress_stations = set(checkpoint.get('in_progress_stations', []))
+        print(f"Resuming crawl: {len(self.processed_stations)} stations already processed, "
+              f"{len(self.in_progress_stations)} were in progress")
+
+    def checkpoint_state(self) -> Dict:
+        """Crawl progress as saved in the checkpoint file"""
+        return {
+            'window': {
+                'start': self.window_start.isoformat(),
+                'days': self.window_days,
+            },
+            'crawl_dates': [d.isoformat() for d in self.crawl_dates],
+            'covered_dates': sorted(self.covered_dates),
+            'processed_stations': sorted(self.processed_stations),
+            'in_progress_stations': sorted(self.in_progress_stations),
+            'complete': self.crawl_ran and not self.in_progress_stations,
+            'saved_at': datetime.now().isoformat(),
+        }
+
+    def save_checkpoint(self):
+        """Persist crawl progress so an interrupted crawl can be resumed"""
+        self.save_uncompressed_json(self.checkpoint_state(), CHECKPOINT_FILE)
+
+        # Trains of the tasks finished so far are on disk now, so they can be marked done
+        if self.work_queue is not None:
+            self.work_queue.confirm()
 
     async def close(self):
         """Close the API session properly"""
+        # A checkpoint still being written owns its train store segment until it is done
+        try:
+            await self.wait_for_checkpoint()
+        except Exception as e:
+            print(f"Warning: Background checkpoint failed: {e}")
+        # Keep trains fetched since the last checkpoint for the next run
+        self.train_store.close()
+        self.tracer.close()
+        if self.work_queue is not None:
+            self.work_queue.close()
         try:
             await self.api.close()
         except:
@@ -122,147 +328,560 @@ class PolishRailwayScraper:
             traceback.print_exc()
             return {}
 
-    async def fetch_trains_for_station(self, station_id: str, station_name: str) -> List[Dict]:
-        """Fetch all train departures from a specific station for a full week and get complete routes"""
-        trains = []
-        new_trains_count = 0
-        cached_trains_count = 0
-
+    async def fetch_departures(self, station_id: str, station_name: str, search_date: date) -> List[Dict]:
+        """Fetch all departures from a station for a single date"""
+        print(f"Fetching departures from {station_name} for {search_date.strftime('%Y-%m-%d')}...")
+        return await self.api.get_departures(int(station_id), search_date)
+
+    def track_train_request(self, key, pending: asyncio.Future):
+        """Register an in-flight train request so concurrent callers can share it"""
+        self.pending_trains[key] = pending
+        self.metrics.set('scraper_pending_train_requests', len(self.pending_trains))
+
+        def forget_request(future):
+            # Failed requests are forgotten too, so a later departure can retry them
+            self.pending_trains.pop(key, None)
+            self.metrics.set('scraper_pending_train_requests', len(self.pending_trains))
+            if not future.cancelled():
+                future.exception()  # Callers that gave up must not leave the error unretrieved
+
+        pending.add_done_callback(forget_request)
+
+    async def request_train(self, train_id: int, departure: Dict, station_id: int,
+                            search_date: date) -> asyncio.Future:
+        """Hand a train route to the train workers, returns a future of the stored Train
+
+        Concurrent requests of the same train share one future, whatever their
+        dates (see add_run). Waits while the train queue is full, which
+        holds back the station workers; only valid while train_pipeline runs.
+        """
+        pending = self.pending_trains.get(train_id)
+        if pending is not None:
+            self.metrics.inc('scraper_train_cache_total', result='shared')
+            return pending
+
+        pending = asyncio.get_running_loop().create_future()
+        self.track_train_request(train_id, pending)
+        await self.train_queue.put((train_id, departure, station_id, search_date, pending))
+        self.metrics.set('scraper_pipeline_queue_depth', self.train_queue.qsize(), stage='train')
+        return pending
+
+    async def train_worker(self):
+        """Pipeline stage: fetch queued train routes and pass them on to the writer"""
+        while True:
+            train_id, departure, station_id, search_date, pending = await self.train_queue.get()
+            self.metrics.set('scraper_pipeline_queue_depth', self.train_queue.qsize(), stage='train')
+            try:
+                train = await self.fetch_train_route(train_id, departure, station_id, search_date)
+                await self.write_queue.put((train, pending))
+                self.metrics.set('scraper_pipeline_queue_depth', self.write_queue.qsize(), stage='write')
+            except Exception as e:
+                if not pending.done():
+                    pending.set_exception(e)
+            finally:
+                self.train_queue.task_done()
+
+    async def train_writer(self):
+        """Pipeline stage: store fetched trains and resolve the requests waiting for them"""
+        while True:
+            train, pending = await self.write_queue.get()
+            self.metrics.set('scraper_pipeline_queue_depth', self.write_queue.qsize(), stage='write')
+            try:
+                self.store_train(train)
+                if not pending.done():
+                    pending.set_result(train)
+            except Exception as e:
+                if not pending.done():
+                    pending.set_exception(e)
+            finally:
+                self.write_queue.task_done()
+
+    @contextlib.asynccontextmanager
+    async def train_pipeline(self):
+        """Run the train and writer stages behind bounded queues for the duration of a crawl"""
+        self.train_queue = asyncio.Queue(SCRAPER_CONFIG['train_queue_size'])
+        self.write_queue = asyncio.Queue(SCRAPER_CONFIG['write_queue_size'])
+        stages = [asyncio.create_task(self.train_worker()) for _ in range(self.train_workers)]
+        stages.append(asyncio.create_task(self.train_writer()))
         try:
-            # Get departures for the next 7 days starting from tomorrow
-            start_date = date.today() + timedelta(days=1)
-
-            for day_offset in range(7):  # 7 days starting from tomorrow
-                search_date = start_date + timedelta(days=day_offset)
-
-                print(f"Fetching departures from {station_name} for {search_date.strftime('%Y-%m-%d')}...")
-
-                # Get all departures from this station for this specific date
-                departures = await self.api.get_departures(int(station_id), search_date)
-
-                if departures:
-                    print(f"Found {len(departures)} departures for {search_date.strftime('%Y-%m-%d')}")
-
-                    # Create progress bar for trains at this station on this date
-                    with tqdm(departures, desc=f"{station_name[:20]} - {search_date.strftime('%m-%d')}", unit="train", leave=False) as pbar:
-                        for departure in pbar:
-                            # Extract train info from departure data
-                            train_id = departure.get('stations', [{}])[0].get('train_id') if departure.get('stations') else None
-
-                            if train_id:
-                                train_id_str = str(train_id)
-
-                                # Check if train is already in cache
-                                if train_id_str in self.trains:
-                                    # Train already exists, use cached data
-                                    trains.append(self.trains[train_id_str])
-                                    cached_trains_count += 1
-                                    train_name = departure.get('train_full_name', f'Train {train_id}')
-                                    pbar.set_postfix_str(f"Cached: {train_name}")
-                                else:
-                                    # Train not in cache, fetch from API
-                                    train_name = departure.get('train_full_name', f'Train {train_id}')
-                                    pbar.set_postfix_str(f"Fetching: {train_name}")
-
-                                    train_details = await self.api.get_train(train_id)
-                                    train_info = train_details['train']
-
-                                    # Extract all stops from the train route
-                                    stops = []
-                                    for stop in train_details['stops']:
-                                        stops.append({
-                                            'station_id': stop.get('station_id'),
-                                            'station_name': stop.get('station_name'),
-                                            'arrival_time': stop.get('arrival'),
-                                            'departure_time': stop.get('departure'),
-                                        })
-
-                                    # Store the complete train information
-                                    self.trains[train_id_str] = {
-                                        'train_id': train_id,
-                                        'train_number': departure.get('train_full_name'),
-                                        'carrier': departure.get('brand_id'),
-                                        'date': search_date.strftime('%Y-%m-%d'),
-                                        'stops': stops,
-                                        'route_name': train_info.get('name', ''),
-                                        'total_stops': len(stops)
-                                    }
-
-                                    trains.append(self.trains[train_id_str])
-                                    new_trains_count += 1
-
-                                    # Small delay between train detail requests
-                                    await asyncio.sleep(0.2)
-                else:
-                    print(f"No departures found for {search_date.strftime('%Y-%m-%d')}")
-
-                # Add delay between date requests to avoid overwhelming the API
-                if day_offset < 6:  # Don't delay after the last day
-                    await asyncio.sleep(0.3)
-
-            print(f"✓ Completed {station_name} (7 days): {len(trains)} total trains ({cached_trains_count} cached, {new_trains_count} new)")
-
-            # Add delay to avoid overwhelming the API (only if we made new requests)
-            if new_trains_count > 0:
-                await asyncio.sleep(0.5)
+            yield
+            await self.train_queue.join()
+            await self.write_queue.join()
+        finally:
+            for stage in stages:
+                stage.cancel()
+            self.train_queue = None
+            self.write_queue = None
+
+    async def get_train_details(self, train_id: int) -> Dict:
+        """get_train response of a train, fetched once by all processes sharing a work queue"""
+        queue = self.work_queue
+        if queue is None:
+            return await self.api.get_train(train_id)
+
+        while True:
+            details, claimed = await asyncio.to_thread(queue.claim_train, train_id)
+            if details is not None:
+                self.metrics.inc('scraper_work_queue_trains_total', result='shared')
+                return details
+            if claimed:
+                break
+            # Another process is fetching the route right now
+            await asyncio.sleep(WORK_QUEUE_CONFIG['train_poll_seconds'])
 
+        try:
+            details = await self.api.get_train(train_id)
+        except BaseException:
+            await asyncio.shield(asyncio.to_thread(queue.release_train, train_id))
+            raise
+        await asyncio.to_thread(queue.store_train, train_id, details)
+        self.metrics.inc('scraper_work_queue_trains_total', result='fetched')
+        return details
+
+    async def fetch_train_route(self, train_id: int, departure: Dict, station_id: int, search_date: date) -> Train:
+        """Fetch the complete route of a train, with the date of its run that leaves `station_id` on `search_date`"""
+        train_details = await self.get_train_details(train_id)
+        train_info = train_details['train']
+
+        # Extract all stops from the train route
+        stops = []
+        for stop in train_details['stops']:
+            stops.append({
+                'station_id': stop.get('station_id'),
+                'station_name': stop.get('station_name'),
+                'arrival_time': stop.get('arrival'),
+                'departure_time': stop.get('departure'),
+            })
+
+        # Store the complete train information
+        train = Train.from_stops(
+            train_id,
+            departure.get('train_full_name'),
+            departure.get('brand_id'),
+            (),
+            train_info.get('name', ''),
+            stops
+        )
+        train.dates.add(run_date(train, station_id, search_date))
+        return train
+
+    def store_train(self, train: Train):
+        """Add a fetched train to the cache and the train store; its route replaces a cached one"""
+        cached = self.trains.get(train.key)
+        if cached is not None:
+            train.dates |= cached.dates
+        self.trains[train.key] = train
+        self.fetched_routes.add(train.train_id)
+        self.train_store.append(train.key, train.to_dict())
+        self.new_trains_since_checkpoint += 1
+        self.metrics.inc('scraper_train_cache_total', result='miss')
+
+    def add_run(self, train: Train, station_id: int, search_date: date) -> Train:
+        """Add the run of a fetched train that leaves `station_id` on `search_date`, returns the train
+
+        Only the new date goes to the train store, the route is stored once.
+        """
+        date_of_run = run_date(train, station_id, search_date)
+        if date_of_run not in train.dates:
+            train.dates.add(date_of_run)
+            self.train_store.append(train.key, {'train_id': train.train_id, 'dates': [date_of_run]})
+            self.metrics.inc('scraper_train_runs_reused_total')
+        return train
+
+    def cached_train(self, train_id: int, station_id: int, search_date: date):
+        """The cached train leaving `station_id` on `search_date`, or None
+
+        A route fetched by this crawl serves every date; one loaded from
+        earlier crawls only the dates it was seen running on.
+        """
+        train = self.trains.get(train_key(train_id))
+        if train is None:
+            return None
+        if train_id in self.fetched_routes:
+            return self.add_run(train, station_id, search_date)
+        if run_date(train, station_id, search_date) in train.dates:
+            return train
+        return None
+
+    async def fetch_trains_for_station(self, station_id: str, station_name: str) -> Tuple[List[Train], List[date]]:
+        """Fetch all train departures from a specific station for a full week and get complete routes
+
+        Returns the trains and the dates that failed, see fetch_trains_for_dates.
+        """
+        try:
+            return await self.fetch_trains_for_dates(station_id, station_name, self.crawl_dates)
         except Exception as e:
             print(f"✗ Error fetching trains from {station_name}: {e}")
             import traceback
             traceback.print_exc()
-
-        return trains
+            return [], list(self.crawl_dates)
+
+    async def fetch_trains_for_dates(self, station_id: str, station_name: str,
+                                     search_dates: List[date]) -> Tuple[List[Train], List[date]]:
+        """Fetch the departures of a station on the given dates and the complete routes of their trains
+
+        Returns the trains and the dates whose departures or train routes still
+        failed after their retries; the trains of the other dates are kept.
+        """
+        trains = {}  # Trains departing on any of the dates, by key
+        failed_dates = set()
+        requests = []  # (future, date) of the trains handed to the train workers
+        new_trains_count = 0
+        cached_trains_count = 0
+        handled = 0
+
+        # The days are independent, so query them all at once; the rate limiter
+        # still keeps the combined requests within the API budget
+        daily_departures = await asyncio.gather(*(
+            self.fetch_departures(station_id, station_name, search_date)
+            for search_date in search_dates
+        ), return_exceptions=True)
+
+        for search_date, departures in zip(search_dates, daily_departures):
+            if isinstance(departures, BaseException):
+                print(f"✗ Error fetching departures from {station_name} for {search_date.isoformat()}: {departures}")
+                failed_dates.add(search_date)
+            elif departures:
+                print(f"Found {len(departures)} departures for {search_date.strftime('%Y-%m-%d')}")
+
+                # Create progress bar for trains at this station on this date
+                # Nested progress bars would interleave when several stations run at once
+                with tqdm(departures, desc=f"{station_name[:20]} - {search_date.strftime('%m-%d')}", unit="train", leave=False,
+                          disable=self.concurrency > 1) as pbar:
+                    for departure in pbar:
+                        # Cache hits and queue puts with room left never wait, so give the other tasks a turn
+                        handled += 1
+                        if handled % DEPARTURES_PER_YIELD == 0:
+                            await asyncio.sleep(0)
+
+                        # Extract train info from departure data
+                        train_id = departure.get('stations', [{}])[0].get('train_id') if departure.get('stations') else None
+
+                        if train_id:
+                            # Check if this run of the train is already in cache
+                            train = self.cached_train(train_id, int(station_id), search_date)
+                            if train is not None:
+                                # Train already exists, use cached data
+                                trains[train.key] = train
+                                cached_trains_count += 1
+                                self.metrics.inc('scraper_train_cache_total', result='hit')
+                                train_name = departure.get('train_full_name', f'Train {train_id}')
+                                pbar.set_postfix_str(f"Cached: {train_name}")
+                            else:
+                                # Train not in cache, fetch from API
+                                train_name = departure.get('train_full_name', f'Train {train_id}')
+                                pbar.set_postfix_str(f"Fetching: {train_name}")
+
+                                request = await self.request_train(train_id, departure, int(station_id), search_date)
+                                requests.append((request, search_date))
+                                new_trains_count += 1
+            else:
+                print(f"No departures found for {search_date.strftime('%Y-%m-%d')}")
+
+        # The station only counts as done once all its trains are stored; shielded, since the
+        # requests may be shared with other stations. A shared request may have fetched the
+        # route for another date. Departures of one train on several dates share a request.
+        await asyncio.gather(*(asyncio.shield(request) for request in dict.fromkeys(r for r, _ in requests)),
+                             return_exceptions=True)
+        for request, search_date in requests:
+            if request.cancelled() or request.exception() is not None:
+                failed_dates.add(search_date)
+                continue
+            train = self.add_run(request.result(), int(station_id), search_date)
+            trains[train.key] = train
+
+        if failed_dates:
+            print(f"✗ Incomplete {station_name}: {len(trains)} trains, failed on "
+                  f"{', '.join(d.isoformat() for d in sorted(failed_dates))}")
+        else:
+            print(f"✓ Completed {station_name} ({len(search_dates)} days): {len(trains)} total trains ({cached_trains_count} cached, {new_trains_count} new)")
+
+        return list(trains.values()), sorted(failed_dates)
 
     async def scrape_all_trains(self):
         """Scrape trains from all stations (full scraping)"""
+        if not self.crawl_dates:
+            print("All days of the crawl window are already covered, nothing to scrape")
+            return
+
         print("Starting full train scraping...")
         print("This will fetch trains from all stations and get complete routes!")
+        print(f"Crawling with {self.concurrency} concurrent station worker(s)")
 
         all_station_items = list(self.stations.items())
         station_items = [s for s in all_station_items if s[1]['transport_mode'] == 'rail']
+        if self.shard_count > 1:
+            rail_count = len(station_items)
+            station_items = [s for s in station_items if shard_of(s[0], self.shard_count) == self.shard_index]
+            print(f"Shard {self.shard_index} of {self.shard_count}: {len(station_items)} of {rail_count} rail stations")
+
+        if self.work_queue is not None:
+            await self.scrape_work_queue(station_items)
+            self.crawl_ran = True
+            return
+
+        # Shared crawl plan; stations processed in an earlier run are skipped up front,
+        # stations interrupted by that run are picked up first and the rest go hubs first
+        pending_ids = [station_id for station_id, _ in station_items if station_id not in self.processed_stations]
+        planner = CrawlPlanner(pending_ids, self.departure_patterns, resumed=self.in_progress_stations)
+        crawl_dates = {d.isoformat() for d in self.crawl_dates}
+        planner.record(train for train in self.trains.values() if not train.dates.isdisjoint(crawl_dates))
+        print("Crawl plan: " + ", ".join(f"{count} {kind}" for kind, count in planner.counts().items()) +
+              (" (explained stations are skipped)" if self.skip_explained else ""))
+        skipped = len(station_items) - len(planner)
+        self.in_progress_stations = set()
+
+        async def station_worker(pbar):
+            while True:
+                planned = planner.next_station()
+                if planned is None:
+                    return
+                station_id, explained = planned
+                station_info = self.stations[station_id]
+                self.metrics.set('scraper_station_queue_depth', len(planner))
+
+                if explained and self.skip_explained:
+                    # Every known train leaving this station was already found elsewhere
+                    self.processed_stations.add(station_id)
+                    self.crawled_since_checkpoint += 1
+                    self.metrics.inc('scraper_planner_skipped_stations_total')
+                    pbar.update(1)
+                    continue
+
+                self.in_progress_stations.add(station_id)
 
-        # Create progress bar for all stations
-        with tqdm(station_items, desc="Processing all stations", unit="station") as pbar:
-            for station_id, station_info in pbar:
                 # Update progress bar with current station
                 pbar.set_postfix_str(f"Station: {station_info['name'][:30]}")
 
-                # Skip if already processed
-                if station_id in self.processed_stations:
-                    pbar.set_postfix_str(f"Skipped: {station_info['name'][:30]} (already processed)")
-                    continue
-
-                trains = await self.fetch_trains_for_station(
-                    str(station_id), station_info['name']
-                )
-
-                self.processed_stations.add(station_id)
+                with self.tracer.span('station', station_id=station_id, station_name=station_info['name']) as span, \
+                        self.metrics.timer('scraper_station_seconds'):
+                    trains, failed_dates = await self.fetch_trains_for_station(
+                        str(station_id), station_info['name']
+                    )
+                    span['trains'] = len(trains)
+                    span['failed_dates'] = len(failed_dates)
+                planner.record(trains)
+
+                # The event loop is single-threaded, so the bookkeeping below runs
+                # without interleaving with other workers. A station with failed dates
+                # stays in progress, so the next run retries it first.
+                if not failed_dates:
+                    self.in_progress_stations.discard(station_id)
+                    self.processed_stations.add(station_id)
+                self.crawled_since_checkpoint += 1
+                pbar.update(1)
                 pbar.set_postfix_str(f"Completed: {station_info['name'][:30]} ({len(trains)} trains)")
 
-                # Save progress every 500 stations
-                if len(self.processed_stations) % 500 == 0:
-                    self.save_partial_data()
+                # Save progress in the background when a checkpoint is due
+                self.start_checkpoint()
+
+        # Create progress bar for all stations
+        with tqdm(total=len(station_items), initial=skipped, desc="Processing all stations", unit="station") as pbar:
+            if skipped:
+                pbar.set_postfix_str(f"Skipped {skipped} already processed stations")
+            async with self.train_pipeline():
+                workers = [asyncio.create_task(station_worker(pbar)) for _ in range(self.concurrency)]
+                try:
+                    await asyncio.gather(*workers)
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+            await self.wait_for_checkpoint()
+
+        self.crawl_ran = True
+        if self.in_progress_stations:
+            # The checkpoint stays incomplete, so the next run of these dates retries only these stations
+            print(f"{len(self.in_progress_stations)} stations failed on some dates, run again to retry them")
+        else:
+            # Every station has now been crawled for these dates, later delta runs can skip them
+            self.covered_dates.update(d.isoformat() for d in self.crawl_dates)
 
         print("Full train scraping completed!")
 
-    def save_partial_data(self):
-        """Save partial data to avoid losing progress"""
-        print("Saving partial data...")
-        self.save_compressed_data()
+    async def scrape_work_queue(self, station_items):
+        """Crawl (station, date) tasks claimed from the shared work queue until none are left
+
+        Queue calls run in a thread: they may wait for another process's
+        transaction, which must not stall the requests in flight.
+        """
+        queue = self.work_queue
+        tasks = [(station_id, d.isoformat()) for station_id, _ in station_items for d in self.crawl_dates]
+        added = await asyncio.to_thread(queue.add_tasks, tasks)
+        counts = await asyncio.to_thread(queue.counts)
+        print(f"Work queue {queue.path}: {added} tasks added, " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+
+        async def heartbeat():
+            # Leases must outlive tasks that take longer than lease_seconds, e.g. a hub under a low request budget
+            while True:
+                await asyncio.sleep(WORK_QUEUE_CONFIG['heartbeat_seconds'])
+                await asyncio.to_thread(queue.renew)
+
+        async def task_worker(pbar):
+            while True:
+                task = await asyncio.to_thread(queue.claim)
+                if task is None:
+                    # Finished tasks stay leased until confirmed, which would keep other processes waiting
+                    if queue.finished:
+                        self.start_checkpoint(force=True)
+                        await self.wait_for_checkpoint()
+                    # Leases of a process that died expire and its tasks come back
+                    if not await asyncio.to_thread(queue.others_active):
+                        return
+                    await asyncio.sleep(WORK_QUEUE_CONFIG['poll_seconds'])
+                    continue
+
+                station_id, task_date = task
+                station_name = self.stations.get(station_id, {}).get('name', str(station_id))
+                pbar.set_postfix_str(f"Station: {station_name[:30]} {task_date}")
+
+                with self.tracer.span('task', station_id=station_id, date=task_date) as span, \
+                        self.metrics.timer('scraper_task_seconds'):
+                    try:
+                        trains, failed_dates = await self.fetch_trains_for_dates(str(station_id), station_name,
+                                                                                 [date.fromisoformat(task_date)])
+                    except Exception as e:
+                        print(f"✗ Error fetching trains from {station_name} for {task_date}: {e}")
+                        failed_dates = [task_date]
+                    if failed_dates:
+                        await asyncio.to_thread(queue.release, station_id, task_date)
+                        self.metrics.inc('scraper_work_queue_tasks_total', result='released')
+                        continue
+                    span['trains'] = len(trains)
+
+                queue.finish(station_id, task_date)
+                self.metrics.inc('scraper_work_queue_tasks_total', result='finished')
+                self.processed_stations.add(station_id)
+                self.crawled_since_checkpoint += 1
+                pbar.update(1)
+
+                # Finished tasks are confirmed by the checkpoint that makes their trains durable
+                self.start_checkpoint()
+
+        remaining = counts['pending'] + counts['leased']
+        with tqdm(total=remaining, desc="Processing queued tasks", unit="task") as pbar:
+            async with self.train_pipeline():
+                workers = [asyncio.create_task(task_worker(pbar)) for _ in range(self.concurrency)]
+                renewal = asyncio.create_task(heartbeat())
+                try:
+                    await asyncio.gather(*workers)
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                    renewal.cancel()
+            await self.wait_for_checkpoint()
+
+        counts = await asyncio.to_thread(queue.counts)
+        print("Work queue drained: " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+
+    def checkpoint_due(self) -> bool:
+        """Whether enough stations, time or new trains have passed since the last checkpoint"""
+        return bool(
+            (self.checkpoint_stations and self.crawled_since_checkpoint >= self.checkpoint_stations) or
+            (self.checkpoint_seconds and time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds) or
+            (self.checkpoint_trains and self.new_trains_since_checkpoint >= self.checkpoint_trains))
+
+    def start_checkpoint(self, force: bool = False):
+        """Start a background checkpoint if one is due (or forced) and none is running
+
+        Raises the error of a failed earlier checkpoint, which stops the crawl
+        like a failing save always did.
+        """
+        if self.checkpoint_task is not None and self.checkpoint_task.done():
+            task, self.checkpoint_task = self.checkpoint_task, None
+            task.result()
+        if self.checkpoint_task is None and (force or self.checkpoint_due()):
+            self.checkpoint_task = asyncio.create_task(self.save_partial_data())
+
+    async def wait_for_checkpoint(self):
+        """Wait until the background checkpoint, if any, is written"""
+        while self.checkpoint_task is not None:
+            task = self.checkpoint_task
+            try:
+                # Shielded, so a cancelled waiter leaves the checkpoint to finish
+                await asyncio.shield(task)
+            finally:
+                if self.checkpoint_task is task and task.done():
+                    self.checkpoint_task = None
+
+    async def save_partial_data(self):
+        """Save partial data to avoid losing progress
+
+        The crawl state is snapshotted on the event loop, between two steps of
+        the crawl, so it is consistent without copying the trains. Serializing,
+        compressing and syncing the files then runs in a worker thread while
+        the crawl goes on.
+        """
+        async with self.checkpoint_lock:
+            print("Saving partial data...")
+            with self.metrics.timer('scraper_save_seconds', kind='partial'):
+                with self.metrics.timer('scraper_save_blocking_seconds', kind='partial'):
+                    # Only the trains fetched since the previous checkpoint are written; the trains of
+                    # every station in the snapshot are in this segment or an earlier one
+                    segment, segment_path, records = self.train_store.rotate()
+                    new_trains = self.new_trains_since_checkpoint
+                    stations = dict(self.stations)
+                    checkpoint = self.checkpoint_state()
+                    finished_tasks = set(self.work_queue.finished) if self.work_queue is not None else set()
+                    self.crawled_since_checkpoint = 0
+                    self.new_trains_since_checkpoint = 0
+                    self.last_checkpoint = time.monotonic()
+
+                written = await asyncio.to_thread(self.write_partial_data, stations, segment, segment_path,
+                                                  checkpoint)
+
+                if self.work_queue is not None:
+                    await asyncio.to_thread(self.work_queue.confirm, finished_tasks)
+
+            self.save_bytes = 0
+            for filename, size in written:
+                self.record_written(filename, size)
+            print(f"Flushed {new_trains} new trains ({records} records with run dates) to the train store")
+            self.metrics.set('scraper_last_save_bytes', self.save_bytes, kind='partial')
+            self.export_metrics()
+
+    @staticmethod
+    def write_partial_data(stations: Dict, segment, segment_path: Optional[str],
+                           checkpoint: Dict) -> List[Tuple[str, int]]:
+        """Write a checkpoint snapshot, returns the (file, bytes) written
+
+        Runs in a worker thread, so it only touches its arguments.
+        """
+        written = [('train_store', TrainStore.sync_segment(segment, segment_path))]
+        for filename, compressed in (('stations.json.gz', True), ('stations.json', False)):
+            write_json_mapping(stations.items(), filename, compressed=compressed)
+            written.append((filename, os.path.getsize(filename)))
+
+        # Written after the trains, so the checkpoint never covers unsaved stations
+        with open(CHECKPOINT_FILE + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(CHECKPOINT_FILE + '.tmp', CHECKPOINT_FILE)
+        written.append((CHECKPOINT_FILE, os.path.getsize(CHECKPOINT_FILE)))
+        return written
 
     def save_final_data(self):
         """Save final scraped data"""
         print("Saving final data...")
-        self.save_compressed_data()
+        self.save_bytes = 0
+        with self.metrics.timer('scraper_save_seconds', kind='final'):
+            if self.crawl_ran:
+                self.save_compressed_data()
+            else:
+                # Without a crawl the trains are what was loaded; trains restored from the train
+                # store stay there for the next crawl
+                self.save_stations()
+                print("No crawl ran, keeping the published train files")
+            self.save_checkpoint()
+        self.metrics.set('scraper_last_save_bytes', self.save_bytes, kind='final')
 
         # Generate summary
-        trains_with_routes = sum(1 for train in self.trains.values() if train.get('stops'))
-        total_stops = sum(len(train.get('stops', [])) for train in self.trains.values())
+        trains = self.published_trains()
+        trains_with_routes = sum(1 for train in trains.values() if train.total_stops)
+        total_stops = sum(train.total_stops for train in trains.values())
 
         summary = {
             'scraping_date': datetime.now().isoformat(),
             'total_stations': len(self.stations),
-            'total_trains': len(self.trains),
+            'total_trains': len(trains),
             'trains_with_complete_routes': trains_with_routes,
             'total_stops_across_all_trains': total_stops,
             'stations_processed': len(self.processed_stations)
@@ -272,19 +891,49 @@ class PolishRailwayScraper:
             json.dump(summary, f, ensure_ascii=False, indent=2)
 
         print(f"Scraping summary: {summary}")
+        self.export_metrics()
+
+    def save_reachability_tables(self):
+        """Precompute the fastest direct train from every station to every other one"""
+        if not self.crawl_ran:
+            print("No crawl ran, keeping the reachability tables")
+            return
+        print("Saving reachability tables...")
+        with self.metrics.timer('scraper_save_seconds', kind='reachability'):
+            shards, size = write_reachability_tables(self.published_trains(), 'reachability')
+        self.record_written('reachability', size)
+        print(f"Saved reachability tables for {shards} origin stations ({size / 1024 / 1024:.1f}MB)")
+        self.export_metrics()
+
+    def record_written(self, filename, size=None):
+        """Count the bytes written to a file by the current save"""
+        if size is None:
+            size = os.path.getsize(filename)
+        self.save_bytes += size
+        self.metrics.inc('scraper_bytes_written_total', size, file=filename)
+
+    def export_metrics(self):
+        """Write the metrics file, if one was requested"""
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file)
 
     def save_compressed_json(self, data, filename):
         """Save data as compressed JSON"""
         json_str = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
         json_bytes = json_str.encode('utf-8')
 
-        with gzip.open(filename, 'wb') as f:
+        # Write to a temporary file first so a crash never leaves a truncated file behind
+        with gzip.open(filename + '.tmp', 'wb') as f:
             f.write(json_bytes)
+        os.replace(filename + '.tmp', filename)
+        self.record_written(filename)
 
     def save_uncompressed_json(self, data, filename):
         """Save data as uncompressed JSON"""
-        with open(filename, 'w', encoding='utf-8') as f:
+        with open(filename + '.tmp', 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(filename + '.tmp', filename)
+        self.record_written(filename)
 
     def load_compressed_json(self, filename):
         """Load data from compressed JSON"""
@@ -293,39 +942,67 @@ class PolishRailwayScraper:
             json_str = json_bytes.decode('utf-8')
             return json.loads(json_str)
 
-    def save_compressed_data(self):
-        """Save data in both compressed and uncompressed formats"""
-        # Save compressed versions
+    def published_trains(self) -> Dict[str, Train]:
+        """Trains in the output files: the crawl window's, and the expired ones while no crawl rewrote them"""
+        if self.crawl_ran:
+            return self.trains
+        return {**self.expired_trains, **self.trains}
+
+    def iter_train_records(self, trains: Dict[str, Train]):
+        """Yield (train_key, record) pairs in the trains.json.gz format, one train at a time"""
+        for train_key, train in trains.items():
+            yield train_key, train.to_dict()
+
+    def save_stations(self):
+        """Save stations in both compressed and uncompressed formats"""
         print("Saving compressed stations...")
         self.save_compressed_json(self.stations, 'stations.json.gz')
 
         print("Saving uncompressed stations...")
         self.save_uncompressed_json(self.stations, 'stations.json')
 
-        print("Saving compressed trains...")
-        self.save_compressed_json(self.trains, 'trains.json.gz')
+    def print_compression_ratio(self, label, original_filename, compressed_filename):
+        """Report how much smaller the compressed file is than the uncompressed one"""
+        if os.path.exists(original_filename) and os.path.exists(compressed_filename):
+            original_size = os.path.getsize(original_filename)
+            compressed_size = os.path.getsize(compressed_filename)
+            ratio = (1 - compressed_size / original_size) * 100
+            print(f"{label} compression: {original_size/1024/1024:.1f}MB -> {compressed_size/1024/1024:.1f}MB ({ratio:.1f}% reduction)")
+
+    def save_compressed_data(self):
+        """Save data in both compressed and uncompressed formats"""
+        self.save_stations()
+        trains = self.published_trains()
+
+        # Fold the append-only train store into the published file
+        print("Compacting trains into compressed file...")
+        self.train_store.compact(self.iter_train_records(trains), 'trains.json.gz')
+        self.record_written('trains.json.gz')
 
         print("Saving uncompressed trains...")
-        self.save_uncompressed_json(self.trains, 'trains.json')
+        write_json_mapping(self.iter_train_records(trains), 'trains.json')
+        self.record_written('trains.json')
 
-        # Calculate compression ratios
-        if os.path.exists('stations.json.gz'):
-            stations_original_size = len(json.dumps(self.stations, ensure_ascii=False, indent=2).encode('utf-8'))
-            stations_compressed_size = os.path.getsize('stations.json.gz')
-            stations_ratio = (1 - stations_compressed_size / stations_original_size) * 100
-            print(f"Stations compression: {stations_original_size/1024/1024:.1f}MB -> {stations_compressed_size/1024/1024:.1f}MB ({stations_ratio:.1f}% reduction)")
+        # Same trains column-wise, for readers that should not parse JSON
+        print("Saving columnar trains...")
+        write_train_columns(trains, 'trains.bin.tmp')
+        os.replace('trains.bin.tmp', 'trains.bin')
+        self.record_written('trains.bin')
+
+        # Station -> [(train_key, stop_index)], so consumers need not scan every stop
+        print("Saving station index...")
+        self.save_compressed_json(build_station_index(trains), 'station_index.json.gz')
 
-        if os.path.exists('trains.json.gz'):
-            trains_original_size = len(json.dumps(self.trains, ensure_ascii=False, indent=2).encode('utf-8'))
-            trains_compressed_size = os.path.getsize('trains.json.gz')
-            trains_ratio = (1 - trains_compressed_size / trains_original_size) * 100
-            print(f"Trains compression: {trains_original_size/1024/1024:.1f}MB -> {trains_compressed_size/1024/1024:.1f}MB ({trains_ratio:.1f}% reduction)")
+        # Calculate compression ratios
+        self.print_compression_ratio("Stations", 'stations.json', 'stations.json.gz')
+        self.print_compression_ratio("Trains", 'trains.json', 'trains.json.gz')
+        self.print_compression_ratio("Columnar trains", 'trains.json', 'trains.bin')
 
-        print(f"Saved {len(self.stations)} stations, {len(self.trains)} trains (compressed)")
+        print(f"Saved {len(self.stations)} stations, {len(trains)} trains (compressed)")
 
-async def run_scraper(stations_only):
-    """Main async function to run the scraper"""
-    scraper = PolishRailwayScraper()
+async def run_scraper(stations_only, **scraper_options):
+    """Main async function to run the scraper, `scraper_options` are passed to PolishRailwayScraper"""
+    scraper = PolishRailwayScraper(**scraper_options)
 
     try:
         await scraper.fetch_stations()
@@ -335,6 +1012,7 @@ async def run_scraper(stations_only):
 
         # Save final data
         scraper.save_final_data()
+        scraper.save_reachability_tables()
 
         print("Scraping completed successfully!")
 
@@ -344,11 +1022,66 @@ async def run_scraper(stations_only):
 
 @click.command()
 @click.option('--stations-only', is_flag=True, help='Only fetch stations data')
-def main(stations_only):
+@click.option('--concurrency', type=int, default=SCRAPER_CONFIG['concurrency'], show_default=True,
+              help='Number of stations crawled in parallel')
+@click.option('--train-workers', type=int, default=SCRAPER_CONFIG['train_workers'], show_default=True,
+              help='Number of train routes fetched in parallel for the departures found')
+@click.option('--delta', is_flag=True, help='Only fetch days of the crawl window not covered by earlier crawls')
+@click.option('--response-cache', is_flag=True, help='Reuse API responses cached on disk by earlier runs')
+@click.option('--metrics-file', type=click.Path(dir_okay=False),
+              help='Export metrics at every save (.json for a JSON snapshot, Prometheus text otherwise)')
+@click.option('--trace-file', type=click.Path(dir_okay=False), help='Append per-station and per-request spans as JSON lines')
+@click.option('--skip-explained', is_flag=True,
+              help='Skip stations whose known departures were all found at stations crawled earlier')
+@click.option('--shard-index', type=int, default=0, show_default=True, help='Shard of the rail stations to crawl')
+@click.option('--shard-count', type=int, default=1, show_default=True,
+              help='Number of shards the rail stations are split into (merge them with shards.py)')
+@click.option('--work-queue', type=click.Path(dir_okay=False),
+              help='Claim (station, date) tasks from this SQLite queue shared with other scraper processes')
+@click.option('--checkpoint-stations', type=int,
+              help='Checkpoint after this many crawled stations (or work queue tasks), 0 disables '
+                   f'[default: {SCRAPER_CONFIG["checkpoint_every_stations"]}, 0 with --checkpoint-seconds or '
+                   '--checkpoint-trains]')
+@click.option('--checkpoint-seconds', type=float, default=SCRAPER_CONFIG['checkpoint_every_seconds'],
+              show_default=True, help='Checkpoint after this many seconds, 0 disables')
+@click.option('--checkpoint-trains', type=int, default=SCRAPER_CONFIG['checkpoint_every_trains'],
+              show_default=True, help='Checkpoint after this many new trains, 0 disables')
+@click.option('--data-dir', type=click.Path(file_okay=False),
+              help='Directory for all data files [default: current directory, shards/<index>-of-<count> when '
+                   'sharded, shards/worker-<pid> with --work-queue]')
+def main(stations_only, concurrency, train_workers, delta, response_cache, metrics_file, trace_file, skip_explained,
+         shard_index, shard_count, work_queue, checkpoint_stations, checkpoint_seconds, checkpoint_trains, data_dir):
     """Polish Railway Connections Scraper"""
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise click.BadParameter(f"needs 0 <= shard index < shard count, got {shard_index} of {shard_count}",
+                                 param_hint='--shard-index')
+    # Checkpoints by time or new trains replace the station count unless it is given too
+    if checkpoint_stations is None:
+        checkpoint_stations = 0 if checkpoint_seconds or checkpoint_trains else SCRAPER_CONFIG['checkpoint_every_stations']
+
+    # Every file the scraper reads or writes is relative to the data directory, except those named on the command line
+    if metrics_file:
+        metrics_file = os.path.abspath(metrics_file)
+    if trace_file:
+        trace_file = os.path.abspath(trace_file)
+    if work_queue:
+        # The queue is shared, so it must not move along with the data directory
+        work_queue = os.path.abspath(work_queue)
+        if data_dir is None:
+            data_dir = os.path.join(SHARDS_DIR, f'worker-{os.getpid()}')
+    if data_dir is None and shard_count > 1:
+        data_dir = shard_directory(shard_index, shard_count)
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        os.chdir(data_dir)
+        print(f"Using data directory {data_dir}")
 
     # Run the async scraper
-    asyncio.run(run_scraper(stations_only))
+    asyncio.run(run_scraper(stations_only, concurrency=concurrency, delta=delta, response_cache=response_cache,
+                            metrics_file=metrics_file, trace_file=trace_file, skip_explained=skip_explained,
+                            shard_index=shard_index, shard_count=shard_count, work_queue=work_queue,
+                            train_workers=train_workers, checkpoint_stations=checkpoint_stations,
+                            checkpoint_seconds=checkpoint_seconds, checkpoint_trains=checkpoint_trains))
 
 if __name__ == '__main__':
     main()
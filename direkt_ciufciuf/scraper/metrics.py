@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Metrics and tracing hooks for the Polish Railway Scraper
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_key: Tuple, extra: Tuple = ()) -> str:
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, as in Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """In-process registry of counters, gauges and histograms
+
+    Metrics are identified by name and labels. The registry can be exported
+    as a Prometheus text file or as a JSON snapshot.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.gauges: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str):
+        """Attach a help text shown in the Prometheus export"""
+        self.help[name] = text
+
+    def value(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge series (0 when it was never set)"""
+        key = _label_key(labels)
+        for registry in (self.counters, self.gauges):
+            if key in registry.get(name, {}):
+                return registry[name][key]
+        return 0
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = _label_key(labels)
+        if key not in series:
+            series[key] = Histogram()
+        series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of the block in the `name` histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """All metrics as plain JSON-serializable data"""
+        def series_list(series, value_fn):
+            return [{'labels': dict(key), **value_fn(value)} for key, value in series.items()]
+
+        return {
+            'timestamp': time.time(),
+            'counters': {name: series_list(series, lambda v: {'value': v}) for name, series in self.counters.items()},
+            'gauges': {name: series_list(series, lambda v: {'value': v}) for name, series in self.gauges.items()},
+            'histograms': {
+                name: series_list(series, lambda h: {
+                    'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], h.counts)),
+                    'sum': h.sum,
+                    'count': h.count,
+                })
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind):
+            if name in self.help:
+                lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for kind, registry in (('counter', self.counters), ('gauge', self.gauges)):
+            for name, series in sorted(registry.items()):
+                header(name, kind)
+                for key, value in series.items():
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+
+        for name, series in sorted(self.histograms.items()):
+            header(name, 'histogram')
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(key, (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum}')
+                lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename: str):
+        """Export to `filename`: JSON snapshot for .json files, Prometheus text otherwise"""
+        if filename.endswith('.json'):
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+        with open(filename + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(filename + '.tmp', filename)
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """Records OpenTelemetry-style spans as JSON lines
+
+    Spans opened inside another span (including in asyncio tasks created
+    there) become its children. Without a file the tracer does nothing.
+    """
+
+    def __init__(self, filename: Optional[str] = None):
+        self.filename = filename
+        self._file = open(filename, 'a', encoding='utf-8') if filename else None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the block as a span, yields its attribute dict for adding results"""
+        if self._file is None:
+            yield attributes
+            return
+
+        parent = _current_span.get()
+        span = {
+            'trace_id': parent['trace_id'] if parent else secrets.token_hex(16),
+            'span_id': secrets.token_hex(8),
+            'parent_span_id': parent['span_id'] if parent else None,
+            'name': name,
+            'start_time_unix_nano': time.time_ns(),
+            'attributes': attributes,
+            'status': 'OK',
+        }
+        token = _current_span.set(span)
+        try:
+            yield attributes
+        except BaseException as e:
+            span['status'] = 'ERROR'
+            attributes['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            _current_span.reset(token)
+            span['end_time_unix_nano'] = time.time_ns()
+            self._file.write(json.dumps(span, ensure_ascii=False, default=str) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
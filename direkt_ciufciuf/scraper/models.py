@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory representation of scraped trains
+"""
+
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, Optional
+
+NO_TIME = -1
+NO_STATION = -1
+MINUTES_PER_DAY = 24 * 60
+
+
+def train_key(train_id) -> str:
+    """Key of a train in the cache and the published files; one record holds all its runs"""
+    return str(train_id)
+
+
+def record_dates(record: Dict) -> Iterable[str]:
+    """Run dates of a trains.json.gz record; files written before `dates` existed have a single `date`"""
+    if 'dates' in record:
+        return record['dates']
+    return [record['date']] if record.get('date') else []
+
+
+def pack_time(time_obj: Optional[Dict]) -> int:
+    """Pack a {'hour', 'minute', 'second'} dict into seconds since midnight"""
+    if not time_obj:
+        return NO_TIME
+    return time_obj.get('hour', 0) * 3600 + time_obj.get('minute', 0) * 60 + time_obj.get('second', 0)
+
+
+def unpack_time(seconds: int) -> Optional[Dict]:
+    """Inverse of pack_time"""
+    if seconds == NO_TIME:
+        return None
+    return {'hour': seconds // 3600, 'minute': seconds // 60 % 60, 'second': seconds % 60}
+
+
+class Stop:
+    """A single stop of a train, as seen through Train.stops"""
+
+    __slots__ = ('station_id', 'station_name', 'arrival', 'departure')
+
+    def __init__(self, station_id: Optional[int], station_name: Optional[str], arrival: int, departure: int):
+        self.station_id = station_id
+        self.station_name = station_name
+        self.arrival = arrival  # Seconds since midnight or NO_TIME
+        self.departure = departure
+
+    def to_dict(self) -> Dict:
+        return {
+            'station_id': self.station_id,
+            'station_name': self.station_name,
+            'arrival_time': unpack_time(self.arrival),
+            'departure_time': unpack_time(self.departure),
+        }
+
+
+class Train:
+    """A complete train route stored as parallel arrays
+
+    The stops are kept column-wise: station ids and packed arrival/departure
+    times live in typed arrays and station names are interned, so a cached
+    train costs a few small objects instead of a dict per stop and a dict per
+    time. The API returns a route without a date, so one Train holds the
+    route and the set of dates (YYYY-MM-DD, by its first stop) it runs on.
+    `to_dict` produces the record format of trains.json.gz.
+    """
+
+    __slots__ = ('train_id', 'train_number', 'carrier', 'dates', 'route_name',
+                 'station_ids', 'station_names', 'arrivals', 'departures')
+
+    def __init__(self, train_id: int, train_number: Optional[str], carrier: Optional[int], dates: Iterable[str],
+                 route_name: Optional[str]):
+        self.train_id = train_id
+        self.train_number = train_number
+        self.carrier = carrier
+        self.dates = set(dates)
+        self.route_name = route_name
+        self.station_ids = array('i')
+        self.station_names = ()
+        self.arrivals = array('i')
+        self.departures = array('i')
+
+    @classmethod
+    def from_stops(cls, train_id: int, train_number: Optional[str], carrier: Optional[int], dates: Iterable[str],
+                   route_name: Optional[str], stops) -> 'Train':
+        """Build a train from stop dicts in the trains.json.gz format"""
+        train = cls(train_id, train_number, carrier, dates, route_name)
+        names = []
+        for stop in stops:
+            station_id = stop.get('station_id')
+            train.station_ids.append(NO_STATION if station_id is None else station_id)
+            name = stop.get('station_name')
+            names.append(None if name is None else sys.intern(name))
+            train.arrivals.append(pack_time(stop.get('arrival_time')))
+            train.departures.append(pack_time(stop.get('departure_time')))
+        train.station_names = tuple(names)
+        return train
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Train':
+        """Build a train from a trains.json.gz record"""
+        return cls.from_stops(data['train_id'], data.get('train_number'), data.get('carrier'), record_dates(data),
+                              data.get('route_name'), data.get('stops', []))
+
+    @property
+    def key(self) -> str:
+        return train_key(self.train_id)
+
+    def day_offset(self, station_id: int) -> int:
+        """Midnights passed between the first stop and the departure from `station_id`
+
+        Stop times are times of day, so every time earlier than the one before
+        it means the train went past midnight. 0 when the train does not stop
+        at the station.
+        """
+        days = 0
+        previous = None
+        for stop_station, arrival, departure in zip(self.station_ids, self.arrivals, self.departures):
+            for seconds in (arrival, departure):
+                if seconds == NO_TIME:
+                    continue
+                if previous is not None and seconds < previous:
+                    days += 1
+                previous = seconds
+            if stop_station == station_id:
+                return days
+        return 0
+
+    @property
+    def total_stops(self) -> int:
+        return len(self.station_ids)
+
+    @property
+    def stops(self) -> Iterator[Stop]:
+        for station_id, name, arrival, departure in zip(self.station_ids, self.station_names,
+                                                         self.arrivals, self.departures):
+            yield Stop(None if station_id == NO_STATION else station_id, name, arrival, departure)
+
+    def to_dict(self) -> Dict:
+        """Serialize to the trains.json.gz record format"""
+        stops = [stop.to_dict() for stop in self.stops]
+        return {
+            'train_id': self.train_id,
+            'train_number': self.train_number,
+            'carrier': self.carrier,
+            'dates': sorted(self.dates),
+            'stops': stops,
+            'route_name': self.route_name,
+            'total_stops': len(stops)
+        }
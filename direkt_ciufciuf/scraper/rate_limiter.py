@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Rate limiting helpers for the Polish Railway Scraper
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+class TokenBucket:
+    """Async token bucket shared by every API call of the scraper
+
+    The bucket holds up to `capacity` tokens (the allowed burst) and is refilled
+    at `rate` tokens per second. Each request takes one token and waits when the
+    bucket is empty, so the long-term request rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        # Waiters are served one at a time, in arrival order
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'TokenBucket':
+        """Create a bucket from SCRAPER_CONFIG style settings"""
+        max_per_minute = config.get('max_requests_per_minute')
+        if max_per_minute:
+            rate = max_per_minute / 60.0
+        else:
+            rate = 1.0 / config['delay_between_requests']
+        return cls(rate, config.get('rate_limit_burst', 1))
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket whose tokens are shared with other processes
+
+    `take_token(rate, capacity)` takes a token from the shared bucket and
+    returns 0, or returns the seconds to wait when it is empty (see
+    WorkQueue.take_request_token). It may block, so it runs in a thread.
+    """
+
+    def __init__(self, rate: float, capacity: int, take_token: Callable[[float, int], float]):
+        super().__init__(rate, capacity)
+        self.take_token = take_token
+
+    async def acquire(self):
+        """Wait until a request may be sent by any of the processes"""
+        async with self._lock:
+            while True:
+                wait = await asyncio.to_thread(self.take_token, self.rate, self.capacity)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD controller for the number of API requests in flight
+
+    While responses come back without throttling and with latencies close to
+    the observed baseline, the limit grows by roughly one request per round
+    trip (additive increase). A 429, a 5xx or a timeout cuts it by
+    `decrease_factor` (multiplicative decrease). Only requests started after
+    the previous cut can trigger the next one, so a burst of failures from the
+    same round trip counts once.
+
+    Latency is judged per window of `latency_window` responses rather than per
+    response, so tail latency and event loop stalls do not look like overload:
+    the limit is also cut when the 90th percentile of `slow_windows` windows
+    in a row exceeds the baseline by `latency_spike_factor`. The baseline is
+    the lowest percentile of the last `baseline_windows` windows, so latency
+    that creeps up as the limit grows is still measured against the unloaded
+    API, while a lasting change of the API's own latency is adopted.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1,
+                 latency_spike_factor: float = 2.0, decrease_factor: float = 0.5,
+                 latency_window: int = 50, slow_windows: int = 2, baseline_windows: int = 20):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_spike_factor = latency_spike_factor
+        self.decrease_factor = decrease_factor
+        self.latency_window = max(1, latency_window)
+        self.slow_windows = max(1, slow_windows)
+        self.in_flight = 0
+        self._latencies = []  # Latencies of the current window
+        self._percentiles = deque(maxlen=max(1, baseline_windows))  # 90th percentile of recent windows, in seconds
+        self._slow_in_a_row = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'AdaptiveConcurrencyLimiter':
+        """Create a limiter from SCRAPER_CONFIG style settings"""
+        return cls(config['initial_in_flight_requests'], config['max_in_flight_requests'],
+                   latency_spike_factor=config['latency_spike_factor'],
+                   latency_window=config['latency_window'], slow_windows=config['latency_slow_windows'],
+                   baseline_windows=config['latency_baseline_windows'])
+
+    @property
+    def baseline_latency(self) -> Optional[float]:
+        return min(self._percentiles, default=None)
+
+    async def acquire(self) -> float:
+        """Wait for a free request slot, returns the start time to pass to release"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started_at: float, overloaded: bool):
+        """Free a request slot and adapt the limit to how the request went"""
+        latency = time.monotonic() - started_at
+
+        async with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                if started_at >= self._last_decrease:
+                    self._decrease("throttling or server errors")
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                # Requests started before a cut say nothing about the new limit
+                if started_at >= self._last_decrease:
+                    self._latencies.append(latency)
+                    if len(self._latencies) >= self.latency_window:
+                        self._end_window()
+            self._condition.notify_all()
+
+    def _end_window(self):
+        latencies = sorted(self._latencies)
+        self._latencies = []
+        percentile = latencies[int(len(latencies) * 0.9)]
+        baseline = self.baseline_latency
+        self._percentiles.append(percentile)
+
+        if baseline is None or percentile <= baseline * self.latency_spike_factor:
+            self._slow_in_a_row = 0
+            return
+        self._slow_in_a_row += 1
+        if self._slow_in_a_row >= self.slow_windows:
+            self._decrease(f"latency rise (90th percentile {percentile:.2f}s, baseline {baseline:.2f}s)")
+
+    def _decrease(self, reason: str):
+        previous = int(self.limit)
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        self._last_decrease = time.monotonic()
+        self._latencies = []
+        self._slow_in_a_row = 0
+        print(f"Reducing API concurrency {previous} -> {int(self.limit)} after {reason}")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Precomputed direct-reachability tables, one small file per origin station
+"""
+
+import gzip
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+from models import MINUTES_PER_DAY, NO_STATION, NO_TIME, Train
+from station_index import build_station_index
+
+# The vectorized engine needs numpy; without it the tables are computed station by station
+try:
+    from stop_table import StopTable
+except ImportError:
+    StopTable = None
+
+
+def direct_travel_minutes(departure: int, arrival: int) -> int:
+    """Minutes between a departure and a later arrival, wrapping past midnight
+
+    Works on whole minutes like the map does, so both agree on every time.
+    Returns 0 when either time is missing.
+    """
+    if departure == NO_TIME or arrival == NO_TIME:
+        return 0
+    return (arrival // 60 - departure // 60) % MINUTES_PER_DAY
+
+
+def direct_reachability(trains: Dict[str, Train], entries: List[Tuple[str, int]]) -> Dict[int, List]:
+    """Fastest direct train from one origin to every station reachable without a change
+
+    `entries` are the origin's (train_key, stop_index) pairs from the station
+    index. Each destination maps to [travel_minutes, train_key, train_number,
+    carrier, departure, arrival], times in seconds since midnight. Ties keep
+    the first train, as the map's own scan does.
+    """
+    best = {}
+    for key, start in entries:
+        train = trains[key]
+        departure = train.departures[start]
+        if departure == NO_TIME:
+            continue
+        station_ids = train.station_ids
+        arrivals = train.arrivals
+        origin = station_ids[start]
+        for i in range(start + 1, len(station_ids)):
+            target = station_ids[i]
+            if target == NO_STATION or target == origin:
+                continue
+            minutes = direct_travel_minutes(departure, arrivals[i])
+            if minutes > 0 and (target not in best or best[target][0] > minutes):
+                best[target] = [minutes, key, train.train_number, train.carrier, departure, arrivals[i]]
+    return best
+
+
+def iter_reachability_tables(trains: Dict[str, Train]) -> Iterator[Tuple[int, Dict[int, List]]]:
+    """Yield (origin station id, direct_reachability table) for every station with a departure"""
+    if StopTable is not None:
+        yield from StopTable(trains).iter_reachability()
+        return
+
+    for origin, entries in build_station_index(trains).items():
+        table = direct_reachability(trains, entries)
+        if table:
+            yield origin, table
+
+
+def write_reachability_tables(trains: Dict[str, Train], directory: str = 'reachability') -> Tuple[int, int]:
+    """Write `<directory>/<origin_id>.json.gz` for every station served by a train
+
+    Shards of stations no longer served are removed. Returns the number of
+    shards and the bytes written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = set()
+    total_bytes = 0
+
+    for origin, table in iter_reachability_tables(trains):
+        filename = f"{origin}.json.gz"
+        path = os.path.join(directory, filename)
+        json_bytes = json.dumps(table, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        with gzip.open(path + '.tmp', 'wb') as f:
+            f.write(json_bytes)
+        os.replace(path + '.tmp', path)
+        written.add(filename)
+        total_bytes += os.path.getsize(path)
+
+    for filename in os.listdir(directory):
+        if filename not in written:
+            os.remove(os.path.join(directory, filename))
+
+    return len(written), total_bytes
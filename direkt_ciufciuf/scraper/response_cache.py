@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of KoleoAPI responses for repeated runs and debugging
+"""
+
+import gzip
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    """SQLite backed, content-addressed cache of API responses
+
+    Responses are stored gzip compressed under the SHA-256 of the endpoint name
+    and its arguments. Every endpoint has its own time to live, and once the
+    cache grows over `max_bytes` the least recently used responses are evicted.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Dict[str, float], max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                body BLOB NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'ResponseCache':
+        """Create a cache from RESPONSE_CACHE_CONFIG style settings"""
+        return cls(config['path'], config['ttl_seconds'], int(config['max_size_mb'] * 1024 * 1024))
+
+    @staticmethod
+    def make_key(endpoint: str, args: Tuple) -> str:
+        """Content address of a request"""
+        normalized = [arg.isoformat() if isinstance(arg, date) else arg for arg in args]
+        request = json.dumps([endpoint, normalized], separators=(',', ':'), sort_keys=True)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def get(self, endpoint: str, args: Tuple) -> Tuple[bool, Optional[Any]]:
+        """Look up a response, returns (hit, response)"""
+        key = self.make_key(endpoint, args)
+        row = self.db.execute('SELECT created_at, size, body FROM responses WHERE key = ?', (key,)).fetchone()
+        now = time.time()
+
+        if row is not None and now - row[0] > self.ttl_seconds.get(endpoint, 0):
+            self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.total_bytes -= row[1]
+            row = None
+
+        if row is None:
+            return False, None
+
+        self.db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        return True, json.loads(gzip.decompress(row[2]))
+
+    def put(self, endpoint: str, args: Tuple, response: Any):
+        """Store a response, evicting least recently used ones when the cache is full"""
+        if not self.ttl_seconds.get(endpoint):
+            return
+        try:
+            body = gzip.compress(json.dumps(response, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        except TypeError:
+            return  # Not a plain JSON response, leave it uncached
+
+        key = self.make_key(endpoint, args)
+        now = time.time()
+        previous = self.db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses (key, endpoint, created_at, accessed_at, size, body) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, endpoint, now, now, len(body), body)
+        )
+        self.total_bytes += len(body) - (previous[0] if previous else 0)
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used responses until the cache is back under 90% of its size limit"""
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.db.execute('SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            self.db.executemany('DELETE FROM responses WHERE key = ?', [(key,) for key, _ in rows])
+            self.total_bytes -= sum(size for _, size in rows)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Sharded crawls: deterministic station partitioning and the merge of shard outputs
+Usage: python shards.py [SHARD_DIR ...]
+"""
+
+import glob
+import json
+import os
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+import click
+
+from models import Train, record_dates, train_key
+from reachability import write_reachability_tables
+from station_index import build_station_index
+from train_columns import write_train_columns
+from train_store import TrainStore, iter_json_mapping, write_json_mapping
+
+SHARDS_DIR = 'shards'
+
+
+def shard_of(station_id, shard_count: int) -> int:
+    """Shard a station belongs to; stable across runs, processes and hosts"""
+    return zlib.crc32(str(station_id).encode('utf-8')) % shard_count
+
+
+def shard_directory(shard_index: int, shard_count: int) -> str:
+    """Default data directory of one shard"""
+    return os.path.join(SHARDS_DIR, f'{shard_index}-of-{shard_count}')
+
+
+def load_shard(directory: str) -> Tuple[Dict, Iterable[Tuple[str, Dict]], set]:
+    """Stations, train records and processed stations left behind by one shard's crawl"""
+    stations = {}
+    for stations_file in ('stations.json.gz', 'stations.json'):
+        path = os.path.join(directory, stations_file)
+        if os.path.exists(path):
+            stations = {int(k): v for k, v in iter_json_mapping(path)}
+            break
+
+    def records():
+        for trains_file in ('trains.json.gz', 'trains.json'):
+            path = os.path.join(directory, trains_file)
+            if os.path.exists(path):
+                yield from iter_json_mapping(path)
+                break
+        # Trains fetched after the shard's last compaction, e.g. by a crashed shard
+        yield from TrainStore(os.path.join(directory, 'train_store')).iter_trains()
+
+    processed = set()
+    checkpoint_path = os.path.join(directory, 'crawl_checkpoint.json')
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            processed = set(json.load(f).get('processed_stations', []))
+
+    return stations, records(), processed
+
+
+def merge_shards(directories: Iterable[str], output_dir: str = '.') -> Dict:
+    """Merge shard directories into the canonical output files in `output_dir`
+
+    Shards are read in sorted order and the first route of every train wins,
+    so the same shard outputs always merge to the same files; the run dates
+    of all its records are merged. Returns the scraping summary.
+    """
+    stations = {}
+    trains = {}
+    dates = defaultdict(set)
+    processed_stations = set()
+    duplicates = 0
+
+    for directory in sorted(directories):
+        shard_stations, records, processed = load_shard(directory)
+        for station_id, station in shard_stations.items():
+            stations.setdefault(station_id, station)
+        loaded = 0
+        for _, record in records:
+            key = train_key(record['train_id'])
+            dates[key].update(record_dates(record))
+            if 'stops' not in record:
+                continue  # Run dates added to a route stored earlier
+            if key in trains:
+                duplicates += 1
+                continue
+            trains[key] = Train.from_dict(record)
+            loaded += 1
+        processed_stations |= processed
+        print(f"{directory}: {len(shard_stations)} stations, {loaded} new trains, "
+              f"{len(processed)} stations processed")
+
+    for key, train in trains.items():
+        train.dates = dates[key]
+
+    print(f"Merged {len(trains)} trains ({duplicates} duplicate routes dropped)")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    def output(filename):
+        return os.path.join(output_dir, filename)
+
+    write_json_mapping(stations.items(), output('stations.json.gz'), compressed=True)
+    write_json_mapping(stations.items(), output('stations.json'))
+    write_json_mapping(((key, train.to_dict()) for key, train in trains.items()), output('trains.json.gz'),
+                       compressed=True)
+    write_json_mapping(((key, train.to_dict()) for key, train in trains.items()), output('trains.json'))
+    write_json_mapping(build_station_index(trains).items(), output('station_index.json.gz'), compressed=True)
+    write_train_columns(trains, output('trains.bin'))
+    write_reachability_tables(trains, output('reachability'))
+
+    summary = {
+        'scraping_date': datetime.now().isoformat(),
+        'total_stations': len(stations),
+        'total_trains': len(trains),
+        'trains_with_complete_routes': sum(1 for train in trains.values() if train.total_stops),
+        'total_stops_across_all_trains': sum(train.total_stops for train in trains.values()),
+        'stations_processed': len(processed_stations)
+    }
+    with open(output('scraping_summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"Scraping summary: {summary}")
+    return summary
+
+
+@click.command()
+@click.argument('directories', nargs=-1, type=click.Path(exists=True, file_okay=False))
+@click.option('--output-dir', default='.', show_default=True, type=click.Path(file_okay=False),
+              help='Where the merged files are written')
+def main(directories, output_dir):
+    """Merge the outputs of sharded crawls (all of shards/ by default)"""
+    directories = directories or sorted(glob.glob(os.path.join(SHARDS_DIR, '*', '')))
+    if not directories:
+        raise click.UsageError(f"No shard directories given and none found in {SHARDS_DIR}/")
+    merge_shards(directories, output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Station -> trains inverted index shipped alongside trains.json.gz
+"""
+
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from models import NO_STATION, Train
+
+
+def build_station_index(trains: Dict[str, Train]) -> Dict[int, List[Tuple[str, int]]]:
+    """Map every station id to the (train_key, stop_index) pairs of the trains stopping there
+
+    Lets consumers find the trains serving a station without scanning every
+    stop of every train. A train calling at a station twice appears twice.
+    """
+    index = defaultdict(list)
+    for train_key, train in trains.items():
+        for stop_index, station_id in enumerate(train.station_ids):
+            if station_id != NO_STATION:
+                index[station_id].append((train_key, stop_index))
+    return dict(index)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Columnar stop table with vectorized direct-reachability queries (requires numpy)
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from models import MINUTES_PER_DAY, NO_STATION, NO_TIME, Train
+
+NO_INDEX = -1
+
+# Upper bound of (origin stop, later stop) pairs materialized at once
+PAIR_BATCH_SIZE = 4_000_000
+
+
+def first_of_groups(*keys: np.ndarray) -> np.ndarray:
+    """Positions of the first element of every run of equal keys in sorted arrays"""
+    if not len(keys[0]):
+        return np.zeros(0, dtype=np.int64)
+    changed = np.zeros(len(keys[0]), dtype=bool)
+    changed[0] = True
+    for key in keys:
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+
+class StopTable:
+    """Every stop of every train as one row of parallel NumPy columns
+
+    Rows are ordered by train, then by stop sequence, so the stops of train t
+    are rows `train_offsets[t]:train_offsets[t + 1]`. Station ids are
+    dictionary-encoded into `station_idx` (codes into `stations`) and times are
+    minutes since midnight; both use NO_INDEX when missing. That is all the
+    direct travel time calculation looks at.
+    """
+
+    def __init__(self, trains: Dict[str, Train]):
+        self.trains = trains
+        self.train_keys = list(trains)
+
+        lengths = np.fromiter((train.total_stops for train in trains.values()), dtype=np.int64,
+                              count=len(trains))
+        self.train_offsets = np.zeros(len(trains) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.train_offsets[1:])
+        rows = int(self.train_offsets[-1])
+
+        station_ids = np.empty(rows, dtype=np.int64)
+        arrivals = np.empty(rows, dtype=np.int32)
+        departures = np.empty(rows, dtype=np.int32)
+        for train, start in zip(trains.values(), self.train_offsets[:-1].tolist()):
+            end = start + train.total_stops
+            station_ids[start:end] = train.station_ids
+            arrivals[start:end] = train.arrivals
+            departures[start:end] = train.departures
+
+        self.train_idx = np.repeat(np.arange(len(trains), dtype=np.int32), lengths)
+        self.stop_seq = (np.arange(rows) - np.repeat(self.train_offsets[:-1], lengths)).astype(np.int32)
+
+        known = station_ids != NO_STATION
+        self.stations, codes = np.unique(station_ids[known], return_inverse=True)
+        self.station_idx = np.full(rows, NO_INDEX, dtype=np.int32)
+        self.station_idx[known] = codes
+
+        self.arr_min = np.where(arrivals == NO_TIME, NO_INDEX, arrivals // 60).astype(np.int16)
+        self.dep_min = np.where(departures == NO_TIME, NO_INDEX, departures // 60).astype(np.int16)
+
+    def __len__(self) -> int:
+        return len(self.train_idx)
+
+    def station_codes(self, station_ids: Iterable[int]) -> np.ndarray:
+        """Dictionary codes of the given station ids, skipping stations no train serves"""
+        station_ids = np.fromiter(station_ids, dtype=np.int64)
+        codes = np.searchsorted(self.stations, station_ids)
+        found = codes < len(self.stations)
+        found[found] = self.stations[codes[found]] == station_ids[found]
+        return codes[found]
+
+    def pair_batches(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(origin row, later row of the same train) pairs, a few whole trains at a time"""
+        lengths = np.diff(self.train_offsets)
+        pairs_before = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths * (lengths - 1) // 2, out=pairs_before[1:])
+
+        first = 0
+        while first < len(lengths):
+            last = int(np.searchsorted(pairs_before, pairs_before[first] + PAIR_BATCH_SIZE, side='right')) - 1
+            last = min(max(last, first + 1), len(lengths))
+
+            start, end = self.train_offsets[first], self.train_offsets[last]
+            successors = (lengths[self.train_idx[start:end]] - 1 - self.stop_seq[start:end]).astype(np.int64)
+            origins = np.repeat(np.arange(start, end), successors)
+            group_starts = np.repeat(np.cumsum(successors) - successors, successors)
+            yield origins, origins + 1 + np.arange(len(origins)) - group_starts
+            first = last
+
+    def direct_travel_times(self, origins: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, ...]:
+        """Fastest direct connection for every (origin, destination) station pair
+
+        Returns parallel arrays (origin code, destination code, minutes, origin
+        row, destination row) sorted by origin then destination, optionally
+        restricted to a batch of origin station ids. Ties go to the earliest
+        train and stop, as in reachability.direct_reachability.
+        """
+        wanted = None if origins is None else self.station_codes(origins)
+        candidates = []
+
+        for origin_rows, target_rows in self.pair_batches():
+            origin_stations = self.station_idx[origin_rows]
+            target_stations = self.station_idx[target_rows]
+            departures = self.dep_min[origin_rows].astype(np.int32)
+            arrivals = self.arr_min[target_rows].astype(np.int32)
+            minutes = (arrivals - departures) % MINUTES_PER_DAY
+
+            valid = ((origin_stations != NO_INDEX) & (target_stations != NO_INDEX) &
+                     (origin_stations != target_stations) &
+                     (departures != NO_INDEX) & (arrivals != NO_INDEX) & (minutes > 0))
+            if wanted is not None:
+                valid &= np.isin(origin_stations, wanted)
+
+            batch = (origin_stations[valid], target_stations[valid], minutes[valid],
+                     origin_rows[valid], target_rows[valid])
+            candidates.append(self._fastest(len(self.stations), *batch))
+
+        if not candidates:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty, empty
+        # Batches follow train order, so the stable sort still breaks ties by train
+        return self._fastest(len(self.stations), *(np.concatenate(column) for column in zip(*candidates)))
+
+    @staticmethod
+    def _fastest(station_count, origin_stations, target_stations, minutes, origin_rows,
+                 target_rows) -> Tuple[np.ndarray, ...]:
+        """Keep the fastest candidate of every (origin, destination) group
+
+        Candidates come in train and stop order; a stable sort on a single
+        packed (origin, destination, minutes) key keeps the earliest one on ties.
+        """
+        packed = (origin_stations.astype(np.int64) * station_count + target_stations) * MINUTES_PER_DAY + minutes
+        order = np.argsort(packed, kind='stable')
+        columns = [column[order] for column in (origin_stations, target_stations, minutes, origin_rows,
+                                                 target_rows)]
+        best = first_of_groups(columns[0], columns[1])
+        return tuple(column[best] for column in columns)
+
+    def iter_reachability(self, origins: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Dict[int, List]]]:
+        """Yield (origin station id, table) in the format of reachability.direct_reachability"""
+        origin_stations, target_stations, minutes, origin_rows, target_rows = self.direct_travel_times(origins)
+        bounds = np.append(first_of_groups(origin_stations), len(origin_stations)).tolist()
+
+        station_ids = self.stations.tolist()
+        columns = (origin_stations.tolist(), target_stations.tolist(), minutes.tolist(),
+                   self.train_idx[origin_rows].tolist(), self.stop_seq[origin_rows].tolist(),
+                   self.stop_seq[target_rows].tolist())
+
+        for start, end in zip(bounds, bounds[1:]):
+            table = {}
+            for _, target, travel, train_index, origin_seq, target_seq in zip(*(c[start:end] for c in columns)):
+                key = self.train_keys[train_index]
+                train = self.trains[key]
+                table[station_ids[target]] = [travel, key, train.train_number, train.carrier,
+                                              train.departures[origin_seq], train.arrivals[target_seq]]
+            yield station_ids[columns[0][start]], table
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Columnar binary export of trains (trains.bin) and its reader
+
+Layout, all integers little-endian:
+
+    header   '<4sHHIIIII': magic b'CTRN', version, reserved (0),
+             train_count, stop_count, entry_count, string_count, run_count
+
+followed by these sections in order, each padded with zeros to a multiple
+of 8 bytes:
+
+    string_offsets     uint32[string_count + 1]  offsets into string_data
+    string_data        uint8[string_offsets[-1]] concatenated UTF-8 strings
+    entry_station_ids  int32[entry_count]        station dictionary: station id (-1 if none)
+    entry_names        int32[entry_count]        station dictionary: name string (-1 if none)
+    train_ids          int64[train_count]
+    train_numbers      int32[train_count]        string index (-1 if none)
+    carriers           int32[train_count]        (-1 if none)
+    route_names        int32[train_count]        string index (-1 if none)
+    run_offsets        uint32[train_count + 1]   run dates of train t are run_offsets[t]:run_offsets[t + 1]
+    run_dates          int32[run_count]          string index of a YYYY-MM-DD date
+    stop_offsets       uint32[train_count + 1]   stops of train t are stop_offsets[t]:stop_offsets[t + 1]
+    stop_entries       int32[stop_count]         station dictionary index
+    arrival_minutes    int16[stop_count]         minute of day (-1 if none)
+    departure_minutes  int16[stop_count]         minute of day (-1 if none)
+    arrival_seconds    uint8[stop_count]         second within the minute
+    departure_seconds  uint8[stop_count]
+
+Every (station id, station name) pair a stop refers to is stored once in the
+station dictionary, and the seconds columns keep the export lossless.
+Section offsets follow from the header counts alone, so readers on
+little-endian hosts map each column straight onto the file buffer.
+"""
+
+import struct
+import sys
+from array import array
+from typing import Dict, Iterator, Optional
+
+from models import NO_STATION, NO_TIME, Train
+
+MAGIC = b'CTRN'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIIIII')
+NONE_INDEX = -1
+
+# (name, array typecode, length) of every section; lengths use the header counts
+SECTIONS = (
+    ('string_offsets', 'I', lambda c: c['string_count'] + 1),
+    ('string_data', 'B', None),
+    ('entry_station_ids', 'i', lambda c: c['entry_count']),
+    ('entry_names', 'i', lambda c: c['entry_count']),
+    ('train_ids', 'q', lambda c: c['train_count']),
+    ('train_numbers', 'i', lambda c: c['train_count']),
+    ('carriers', 'i', lambda c: c['train_count']),
+    ('route_names', 'i', lambda c: c['train_count']),
+    ('run_offsets', 'I', lambda c: c['train_count'] + 1),
+    ('run_dates', 'i', lambda c: c['run_count']),
+    ('stop_offsets', 'I', lambda c: c['train_count'] + 1),
+    ('stop_entries', 'i', lambda c: c['stop_count']),
+    ('arrival_minutes', 'h', lambda c: c['stop_count']),
+    ('departure_minutes', 'h', lambda c: c['stop_count']),
+    ('arrival_seconds', 'B', lambda c: c['stop_count']),
+    ('departure_seconds', 'B', lambda c: c['stop_count']),
+)
+
+
+def padding(size: int) -> int:
+    return -size % 8
+
+
+def split_time(seconds: int):
+    """Seconds since midnight -> (minute of day, second)"""
+    if seconds == NO_TIME:
+        return NONE_INDEX, 0
+    return seconds // 60, seconds % 60
+
+
+def join_time(minute: int, second: int) -> int:
+    return NO_TIME if minute == NONE_INDEX else minute * 60 + second
+
+
+def write_train_columns(trains: Dict[str, Train], filename: str):
+    """Write trains to `filename` in the columnar format described above"""
+    strings = {}
+    entries = {}
+
+    def string_index(value: Optional[str]) -> int:
+        if value is None:
+            return NONE_INDEX
+        return strings.setdefault(value, len(strings))
+
+    columns = {name: array(typecode) for name, typecode, _ in SECTIONS}
+    columns['stop_offsets'].append(0)
+    columns['run_offsets'].append(0)
+
+    for train in trains.values():
+        columns['train_ids'].append(train.train_id)
+        columns['train_numbers'].append(string_index(train.train_number))
+        columns['carriers'].append(NONE_INDEX if train.carrier is None else train.carrier)
+        columns['route_names'].append(string_index(train.route_name))
+        columns['run_dates'].extend(string_index(run_date) for run_date in sorted(train.dates))
+        columns['run_offsets'].append(len(columns['run_dates']))
+
+        for station_id, name, arrival, departure in zip(train.station_ids, train.station_names,
+                                                         train.arrivals, train.departures):
+            entry = entries.get((station_id, name))
+            if entry is None:
+                entry = entries[station_id, name] = len(entries)
+                columns['entry_station_ids'].append(NONE_INDEX if station_id == NO_STATION else station_id)
+                columns['entry_names'].append(string_index(name))
+            columns['stop_entries'].append(entry)
+
+            minute, second = split_time(arrival)
+            columns['arrival_minutes'].append(minute)
+            columns['arrival_seconds'].append(second)
+            minute, second = split_time(departure)
+            columns['departure_minutes'].append(minute)
+            columns['departure_seconds'].append(second)
+        columns['stop_offsets'].append(len(columns['stop_entries']))
+
+    string_data = columns['string_data']
+    string_offsets = columns['string_offsets']
+    string_offsets.append(0)
+    for value in strings:
+        string_data.frombytes(value.encode('utf-8'))
+        string_offsets.append(len(string_data))
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(trains), len(columns['stop_entries']), len(entries),
+                            len(strings), len(columns['run_dates'])))
+        f.write(bytes(padding(HEADER.size)))
+        for name, _, _ in SECTIONS:
+            column = columns[name]
+            if sys.byteorder == 'big':
+                column.byteswap()
+            f.write(column.tobytes())
+            f.write(bytes(padding(len(column) * column.itemsize)))
+
+
+class TrainColumns:
+    """A trains.bin file loaded as one typed column per section
+
+    On little-endian hosts the columns are memoryviews over the file buffer,
+    so loading costs one read and no per-stop parsing. `trains()` rebuilds
+    models.Train objects when the whole record is needed.
+    """
+
+    def __init__(self, buffer: bytes):
+        magic, version, _, train_count, stop_count, entry_count, string_count, run_count = \
+            HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a trains.bin file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported trains.bin version {version}")
+
+        counts = {'train_count': train_count, 'stop_count': stop_count, 'entry_count': entry_count,
+                  'string_count': string_count, 'run_count': run_count}
+        self.train_count = train_count
+        self.stop_count = stop_count
+
+        view = memoryview(buffer)
+        offset = HEADER.size + padding(HEADER.size)
+        for name, typecode, length in SECTIONS:
+            count = self.string_offsets[-1] if length is None else length(counts)
+            size = count * array(typecode).itemsize
+            if offset + size > len(buffer):
+                raise ValueError(f"Truncated trains.bin ({name})")
+            setattr(self, name, self._column(view[offset:offset + size], typecode))
+            offset += size + padding(size)
+
+    @staticmethod
+    def _column(view: memoryview, typecode: str):
+        if sys.byteorder == 'little':
+            return view.cast(typecode)
+        column = array(typecode, view.tobytes())
+        column.byteswap()
+        return column
+
+    @classmethod
+    def load(cls, filename: str) -> 'TrainColumns':
+        with open(filename, 'rb') as f:
+            return cls(f.read())
+
+    def string(self, index: int) -> Optional[str]:
+        if index == NONE_INDEX:
+            return None
+        return bytes(self.string_data[self.string_offsets[index]:self.string_offsets[index + 1]]).decode('utf-8')
+
+    def trains(self) -> Iterator[Train]:
+        """Rebuild every train as a models.Train"""
+        names = [None if name == NONE_INDEX else sys.intern(self.string(name)) for name in self.entry_names]
+        station_ids = [NO_STATION if station_id == NONE_INDEX else station_id
+                       for station_id in self.entry_station_ids]
+
+        for t in range(self.train_count):
+            carrier = self.carriers[t]
+            dates = (self.string(run_date) for run_date in self.run_dates[self.run_offsets[t]:self.run_offsets[t + 1]])
+            train = Train(self.train_ids[t], self.string(self.train_numbers[t]),
+                          None if carrier == NONE_INDEX else carrier, dates, self.string(self.route_names[t]))
+
+            start, end = self.stop_offsets[t], self.stop_offsets[t + 1]
+            stop_entries = self.stop_entries[start:end]
+            train.station_ids = array('i', [station_ids[entry] for entry in stop_entries])
+            train.station_names = tuple(names[entry] for entry in stop_entries)
+            train.arrivals = array('i', map(join_time, self.arrival_minutes[start:end],
+                                            self.arrival_seconds[start:end]))
+            train.departures = array('i', map(join_time, self.departure_minutes[start:end],
+                                              self.departure_seconds[start:end]))
+            yield train
+
+
+def load_train_columns(filename: str) -> Dict[str, Train]:
+    """Read a trains.bin file back into the scraper's {train_key: Train} mapping"""
+    return {train.key: train for train in TrainColumns.load(filename).trains()}
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Append-only on-disk store for scraped trains
+"""
+
+import glob
+import gzip
+import json
+import os
+import re
+import zlib
+from json.decoder import WHITESPACE
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+# Characters that can continue a JSON number
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+class TrainStore:
+    """Append-only log of scraped trains
+
+    Every newly fetched train is written exactly once, as one JSON line, to the
+    current gzip segment in `directory`. `flush` closes the segment so that
+    everything appended so far is durable; the next append starts a new
+    segment. Checkpoints therefore only cost the trains fetched since the last
+    one, and `rotate` lets them sync a segment off the event loop. `compact`
+    folds all trains into the published trains.json.gz and drops the segments.
+    """
+
+    def __init__(self, directory: str = 'train_store'):
+        self.directory = directory
+        self._segment = None
+        self._segment_path = None
+        self.appended = 0  # Trains appended since the last flush
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'segment-*.jsonl.gz')))
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self._segment_paths()
+        number = int(os.path.basename(existing[-1])[len('segment-'):-len('.jsonl.gz')]) + 1 if existing else 1
+        self._segment_path = os.path.join(self.directory, f'segment-{number:06d}.jsonl.gz')
+        self._segment = gzip.open(self._segment_path, 'wb')
+
+    def append(self, key: str, train: Dict):
+        """Append a single train to the current segment"""
+        if self._segment is None:
+            self._open_segment()
+        line = json.dumps({'key': key, 'train': train}, ensure_ascii=False, separators=(',', ':'))
+        self._segment.write(line.encode('utf-8') + b'\n')
+        self.appended += 1
+
+    def rotate(self) -> Tuple[Optional[gzip.GzipFile], Optional[str], int]:
+        """Detach the current segment so that the next append starts a new one
+
+        Returns the segment (None when nothing was appended), its path and the
+        number of trains in it. Hand them to `sync_segment`, which may run in
+        another thread while appends go on.
+        """
+        segment, path, appended = self._segment, self._segment_path, self.appended
+        self._segment = None
+        self._segment_path = None
+        self.appended = 0
+        return segment, path, appended
+
+    @staticmethod
+    def sync_segment(segment: Optional[gzip.GzipFile], path: Optional[str]) -> int:
+        """Close a detached segment and sync it to disk, returns its size"""
+        if segment is None:
+            return 0
+        segment.close()
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+        return os.path.getsize(path)
+
+    def flush(self) -> int:
+        """Close the current segment and sync it to disk, returns the number of trains written"""
+        segment, path, written = self.rotate()
+        self.sync_segment(segment, path)
+        return written
+
+    def iter_trains(self) -> Iterator[Tuple[str, Dict]]:
+        """Yield (key, train) pairs from all segments in write order"""
+        for path in self._segment_paths():
+            try:
+                with gzip.open(path, 'rb') as f:
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Torn last line of a segment that was never flushed
+                        record = json.loads(line)
+                        yield record['key'], record['train']
+            except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+                # A crash before flush leaves an unterminated segment; its complete lines are still valid
+                print(f"Warning: Segment {path} is incomplete ({e}), using the trains read so far")
+
+    def compact(self, trains: Iterable[Tuple[str, Dict]], filename: str):
+        """Write all (key, train) records to `filename` as compressed JSON and drop the merged segments"""
+        self.flush()
+        write_json_mapping(trains, filename, compressed=True)
+        for path in self._segment_paths():
+            os.remove(path)
+
+    def close(self):
+        self.flush()
+
+
+def write_json_mapping(items: Iterable[Tuple[str, Dict]], filename: str, compressed: bool = False):
+    """Write a {key: value} JSON object one entry at a time
+
+    Produces the same JSON as json.dump of the whole dict (compact when
+    compressed, indented otherwise) without building it in memory as a single
+    string. The file is written to a temporary path and moved into place.
+    """
+    tmp_filename = filename + '.tmp'
+    opener = gzip.open if compressed else open
+    with opener(tmp_filename, 'wt', encoding='utf-8') as f:
+        f.write('{')
+        first = True
+        for key, value in items:
+            if compressed:
+                f.write(('' if first else ',') + json.dumps(str(key), ensure_ascii=False) + ':')
+                f.write(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+            else:
+                f.write(('\n  ' if first else ',\n  ') + json.dumps(str(key), ensure_ascii=False) + ': ')
+                f.write(json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+            first = False
+        f.write('}' if compressed or first else '\n}')
+    os.replace(tmp_filename, filename)
+
+
+def iter_json_mapping(filename: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    """Yield the (key, value) pairs of a top-level JSON object one at a time
+
+    The file (gzip compressed when it ends with .gz) is decoded in chunks, so
+    only the current entry and one chunk of text are held in memory instead of
+    the compressed, raw, decoded and parsed forms of the whole file.
+    """
+    decoder = json.JSONDecoder()
+    opener = gzip.open if filename.endswith('.gz') else open
+
+    with opener(filename, 'rt', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def read_more(size=chunk_size):
+            nonlocal buffer, pos, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def next_char():
+            # Skip whitespace and return the next significant character ('' at the end of the file)
+            nonlocal pos
+            while True:
+                pos = WHITESPACE.match(buffer, pos).end()
+                if pos < len(buffer) or eof:
+                    return buffer[pos:pos + 1]
+                read_more()
+
+        def decode_value():
+            nonlocal pos
+            next_char()
+            # Grow the read size while a large entry is incomplete, so it is not re-parsed once per chunk
+            size = chunk_size
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    read_more(size)
+                    size *= 2
+                    continue
+                # A number followed only by number characters (e.g. "1." or "-1.5e") may continue in the next chunk
+                if not eof and NUMBER_TAIL.fullmatch(buffer, end):
+                    read_more(size)
+                    size *= 2
+                    continue
+                pos = end
+                return value
+
+        def expect(char):
+            nonlocal pos
+            if next_char() != char:
+                raise ValueError(f"Expected '{char}' at offset {pos} of {filename}")
+            pos += 1
+
+        expect('{')
+        if next_char() == '}':
+            return
+        while True:
+            key = decode_value()
+            expect(':')
+            yield key, decode_value()
+            char = next_char()
+            if char == '}':
+                return
+            expect(',')
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+SQLite work queue of (station, date) crawl tasks shared by cooperating scraper processes
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+
+
+class WorkQueue:
+    """Crawl tasks leased to one process at a time
+
+    A process claims a task by taking a lease on it for `lease_seconds` and
+    keeps its leases alive by calling `renew` on a heartbeat. Finished tasks are
+    only marked done by `confirm`, which the scraper calls once their trains
+    are durable on disk, so a process that dies loses nothing: its leases
+    expire and the tasks are claimed again by another process. A task whose
+    lease was taken `max_attempts` times without completing counts as failed
+    and is not handed out anymore.
+
+    The processes also share the train routes they fetch (see `claim_train`)
+    and one request budget (see `take_request_token`), so running more of them
+    neither repeats get_train requests nor sends more requests to the API.
+
+    Calls may come from any thread (the scraper runs them with
+    asyncio.to_thread, so waiting for another process's lock never blocks its
+    event loop); they are serialized on the one connection.
+    """
+
+    def __init__(self, path: str, lease_seconds: float, max_attempts: int, owner: Optional[str] = None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.finished = set()  # Tasks finished by this process, not confirmed yet
+
+        # Writers wait for each other's short transactions instead of failing
+        self.db = sqlite3.connect(path, isolation_level=None, timeout=60, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                station_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_expires REAL,
+                finished_at REAL,
+                PRIMARY KEY (station_id, date)
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires)')
+        # get_train responses, or the lease of the process fetching one while details is NULL
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS train_routes (
+                train_id INTEGER PRIMARY KEY,
+                owner TEXT,
+                lease_expires REAL,
+                details TEXT
+            )
+        ''')
+        # Token bucket shared by all processes, see rate_limiter.SharedTokenBucket
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS request_budget (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+    @classmethod
+    def from_config(cls, path: str, config: Dict) -> 'WorkQueue':
+        """Create a queue from WORK_QUEUE_CONFIG style settings"""
+        return cls(path, config['lease_seconds'], config['max_attempts'])
+
+    def add_tasks(self, tasks: Iterable[Tuple[int, str]]) -> int:
+        """Add (station_id, ISO date) tasks that are not queued yet, returns how many were new"""
+        tasks = list(tasks)
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                'INSERT OR IGNORE INTO tasks (station_id, date, status) VALUES (?, ?, ?)',
+                ((station_id, task_date, PENDING) for station_id, task_date in tasks))
+            return self.db.total_changes - before
+
+    def claim(self) -> Optional[Tuple[int, str]]:
+        """Lease the next available task, or return None when no task is available right now"""
+        with self.lock:
+            return self._claim()
+
+    def _claim(self) -> Optional[Tuple[int, str]]:
+        now = time.time()
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.db.execute('''
+                SELECT station_id, date FROM tasks
+                WHERE (status = ? OR (status = ? AND lease_expires < ?)) AND attempts < ?
+                ORDER BY rowid LIMIT 1
+            ''', (PENDING, LEASED, now, self.max_attempts)).fetchone()
+            if row is not None:
+                self.db.execute('''
+                    UPDATE tasks SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE station_id = ? AND date = ?
+                ''', (LEASED, self.owner, now + self.lease_seconds, row[0], row[1]))
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return row
+
+    def renew(self) -> int:
+        """Extend the leases of this process on tasks and train routes, returns how many tasks it holds"""
+        lease_expires = time.time() + self.lease_seconds
+        with self.lock, self.db:
+            self.db.execute('UPDATE train_routes SET lease_expires = ? WHERE details IS NULL AND owner = ?',
+                            (lease_expires, self.owner))
+            return self.db.execute('UPDATE tasks SET lease_expires = ? WHERE status = ? AND owner = ?',
+                                   (lease_expires, LEASED, self.owner)).rowcount
+
+    def finish(self, station_id: int, task_date: str):
+        """Remember a task as finished; it is marked done by the next confirm"""
+        self.finished.add((station_id, task_date))
+
+    def release(self, station_id: int, task_date: str):
+        """Give a failed task back so that any process can retry it"""
+        with self.lock, self.db:
+            self.db.execute('UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL '
+                            'WHERE station_id = ? AND date = ? AND status = ? AND owner = ?',
+                            (PENDING, station_id, task_date, LEASED, self.owner))
+
+    def confirm(self, tasks: Optional[Iterable[Tuple[int, str]]] = None) -> int:
+        """Mark finished tasks done, once their results are safely stored
+
+        Confirms all finished tasks, or only `tasks` when the results of the
+        tasks finished after them may not be stored yet.
+        """
+        finished = list(self.finished if tasks is None else tasks)
+        with self.lock, self.db:
+            self.db.executemany('UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL, finished_at = ? '
+                                'WHERE station_id = ? AND date = ?',
+                                ((DONE, time.time(), station_id, task_date) for station_id, task_date in finished))
+        self.finished.difference_update(finished)
+        return len(finished)
+
+    def claim_train(self, train_id: int) -> Tuple[Optional[Dict], bool]:
+        """Look up a train route fetched by any process, or lease the fetch of it
+
+        Returns (details, False) when the get_train response is stored,
+        (None, True) when this process should fetch it and then call
+        `store_train` or `release_train`, and (None, False) while another
+        process is fetching it.
+        """
+        with self.lock:
+            now = time.time()
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute('SELECT owner, lease_expires, details FROM train_routes WHERE train_id = ?',
+                                      (train_id,)).fetchone()
+                claimed = row is None or (row[2] is None and (row[0] == self.owner or row[1] < now))
+                if claimed:
+                    self.db.execute('INSERT OR REPLACE INTO train_routes (train_id, owner, lease_expires) '
+                                    'VALUES (?, ?, ?)', (train_id, self.owner, now + self.lease_seconds))
+                self.db.execute('COMMIT')
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+        if row is not None and row[2] is not None:
+            return json.loads(row[2]), False
+        return None, claimed
+
+    def store_train(self, train_id: int, details: Dict):
+        """Share the get_train response of a train this process claimed"""
+        with self.lock, self.db:
+            self.db.execute('UPDATE train_routes SET details = ?, owner = NULL, lease_expires = NULL '
+                            'WHERE train_id = ?', (json.dumps(details, ensure_ascii=False), train_id))
+
+    def release_train(self, train_id: int):
+        """Give up the fetch of a claimed train so that any process can retry it"""
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM train_routes WHERE train_id = ? AND details IS NULL AND owner = ?',
+                            (train_id, self.owner))
+
+    def take_request_token(self, rate: float, capacity: int) -> float:
+        """Take a token of the shared request budget
+
+        Returns 0 when a request may be sent, otherwise the seconds to wait
+        before trying again.
+        """
+        with self.lock:
+            now = time.time()
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute('SELECT tokens, updated_at FROM request_budget WHERE id = 0').fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                self.db.execute('INSERT OR REPLACE INTO request_budget (id, tokens, updated_at) VALUES (0, ?, ?)',
+                                (tokens, now))
+                self.db.execute('COMMIT')
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+        return wait
+
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks that are pending, leased, done and failed (out of attempts)"""
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        with self.lock:
+            rows = self.db.execute('''
+                SELECT CASE WHEN status != ? AND attempts >= ? AND (status = ? OR lease_expires < ?) THEN 'failed'
+                            ELSE status END, COUNT(*)
+                FROM tasks GROUP BY 1
+            ''', (DONE, self.max_attempts, PENDING, time.time())).fetchall()
+        for status, count in rows:
+            counts[status] = count
+        return counts
+
+    def others_active(self) -> bool:
+        """Whether tasks that may still come back are leased by other processes"""
+        with self.lock:
+            row = self.db.execute('SELECT 1 FROM tasks WHERE status = ? AND owner != ? AND attempts < ? LIMIT 1',
+                                  (LEASED, self.owner, self.max_attempts)).fetchone()
+        return row is not None
+
+    def close(self):
+        with self.lock:
+            self.db.close()